@@ -1,25 +1,29 @@
+import os
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timezone, timedelta
-import os
+from datetime import datetime
 
-# Configurações
-EXCEL_PATH = "Controle Transferencia.xlsx"
-SHEET_NAME = "Basae"
-FUSO_HORARIO = timezone(timedelta(hours=-3))  # UTC-3
+from config import (
+    ADMIN, EXCEL_PATH, ESCRITAS_PENDENTES_PATH, FUSO_HORARIO, INTERVALO_PAINEL, ROTAS, TAMANHO_PAGINA, OPCOES_TAMANHO_PAGINA,
+    campos_tempo, campos_calculados, campos_segundos, campos_analise, agrupamentos_analise, colunas_controle
+)
+import armazenamento
+import escritas
+import exportacao
+import importacao
+import metricas
+import painel
+from calculos import COLUNA_STATUS, calcular_tempos, detectar_atrasos, formatar_duracao
 
-campos_tempo = [
-    "Entrada na Fábrica", "Encostou na doca Fábrica", "Início carregamento",
-    "Fim carregamento", "Faturado", "Amarração carga", "Saída do pátio",
-    "Entrada CD", "Encostou na doca CD", "Início Descarregamento CD",
-    "Fim Descarregamento CD", "Saída CD"
-]
+# Mede esta execução do script; a anterior, se interrompida por st.rerun(), é gravada agora
+medicao = metricas.iniciar(st.session_state.get("pagina_atual", "Tela Inicial"), st.session_state.get("medicao"))
+st.session_state.medicao = medicao
 
-# Campos de cálculo que devem ser salvos
-campos_calculados = [
-    "Tempo Espera Doca", "Tempo Total", "Tempo de Descarregamento CD",
-    "Tempo Espera Doca CD", "Tempo Total CD", "Tempo Percurso Para CD", "Tempo de Carregamento"
-]
+# Rota (fábrica → CD) escolhida nesta sessão: as páginas leem e gravam só os dados dela
+if st.session_state.get("rota") not in ROTAS:
+    st.session_state.rota = ROTAS[0]
+banco = armazenamento.obter_armazenamento(st.session_state.rota)
+fila_escrita = escritas.obter_fila(banco, os.path.join(armazenamento.pasta_rota(st.session_state.rota), ESCRITAS_PENDENTES_PATH))
 
 # Inicializa session_state para os campos de tempo
 for campo in campos_tempo:
@@ -30,6 +34,11 @@ for campo in campos_tempo:
 if 'pagina_atual' not in st.session_state:
     st.session_state.pagina_atual = "Tela Inicial"
 
+# Gravações enviadas por esta sessão que a fila ainda não confirmou (ID -> descrição)
+if 'escritas_enviadas' not in st.session_state:
+    st.session_state.escritas_enviadas = {}
+    st.session_state.avisos_escrita = []
+
 # Configuração da página
 st.set_page_config(
     page_title="Suzano - Controle de Carga", 
@@ -139,26 +148,57 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Função para calcular diferença de tempo
-def calcular_tempo(inicio, fim):
-    if pd.isna(inicio) or pd.isna(fim) or inicio == "" or fim == "":
-        return ""
-    try:
-        inicio_dt = pd.to_datetime(inicio)
-        fim_dt = pd.to_datetime(fim)
-        diff = fim_dt - inicio_dt
-        horas = int(diff.total_seconds() // 3600)
-        minutos = int((diff.total_seconds() % 3600) // 60)
-        return f"{horas:02d}:{minutos:02d}"
-    except:
-        return ""
-
-# Função para encontrar o último campo preenchido (status)
-def obter_status(registro):
-    for campo in reversed(campos_tempo):
-        if not pd.isna(registro[campo]) and registro[campo] != "":
-            return campo
-    return "Não iniciado"
+# Confere as gravações desta sessão que a fila de escrita já concluiu; quando
+# alguma termina, a página é refeita com os dados gravados e o aviso
+def acompanhar_escritas():
+    concluidas = False
+    for id_escrita, descricao in list(st.session_state.escritas_enviadas.items()):
+        resultado = fila_escrita.resultado(id_escrita)
+        if resultado is None:
+            continue
+        concluidas = True
+        del st.session_state.escritas_enviadas[id_escrita]
+        if resultado["situacao"] == "ok":
+            st.session_state.avisos_escrita.append(f"✅ {descricao} gravado com sucesso!")
+        elif resultado["situacao"] == "conflito":
+            st.session_state.aviso_edicao = "⚠️ Um registro foi alterado por outro conferente enquanto você editava. Confira os dados atualizados e salve novamente."
+            # A próxima edição parte da versão que estiver gravada
+            for chave in [chave for chave in st.session_state if str(chave).startswith("versao_edicao_")]:
+                del st.session_state[chave]
+            st.session_state.avisos_escrita.append(f"⚠️ {descricao} não foi gravado: o registro foi alterado por outro conferente.")
+        else:
+            st.session_state.avisos_escrita.append(f"❌ Erro ao gravar {descricao}: {resultado['mensagem']}")
+    if concluidas:
+        st.rerun()
+
+
+for aviso in st.session_state.avisos_escrita:
+    st.toast(aviso)
+st.session_state.avisos_escrita = []
+
+# Enquanto houver gravações pendentes, a fila é conferida a cada segundo sem refazer a página
+if st.session_state.escritas_enviadas:
+    st.fragment(run_every=1)(acompanhar_escritas)()
+
+# Botão "Registrar" de um campo_tempo no formulário de novo registro
+def registrar_horario(campo):
+    st.session_state[campo] = datetime.now(FUSO_HORARIO).strftime("%Y-%m-%d %H:%M:%S")
+
+
+# Cada linha de horário é um fragmento: o clique em "Registrar" refaz só a
+# própria linha, sem rodar o script inteiro de novo
+@st.fragment
+def linha_horario(campo):
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        valor_atual = st.session_state[campo]
+        if valor_atual:
+            st.success(f"✅ {campo}: {valor_atual}")
+        else:
+            st.info(f"⏳ {campo}: Aguardando registro...")
+    with col2:
+        st.button(f"📝 Registrar", key=f"btn_{campo}", help=f"Registrar {campo}", on_click=registrar_horario, args=(campo,))
+
 
 # Função para botão de voltar
 def botao_voltar():
@@ -166,9 +206,43 @@ def botao_voltar():
         st.session_state.pagina_atual = "Tela Inicial"
         st.rerun()
 
+# Filtros das listas de veículos; são aplicados na consulta, antes de montar os widgets
+def filtros_lista(prefixo):
+    col1, col2, col3, col4 = st.columns([2, 2, 1, 1])
+    with col1:
+        periodo = st.date_input("📅 Período", value=(), format="DD/MM/YYYY", key=f"{prefixo}_periodo")
+    with col2:
+        placa = st.text_input("🚛 Placa", placeholder="Filtrar por placa", key=f"{prefixo}_placa")
+    with col3:
+        tamanho = st.selectbox("Por página", OPCOES_TAMANHO_PAGINA, index=OPCOES_TAMANHO_PAGINA.index(TAMANHO_PAGINA), key=f"{prefixo}_tamanho")
+    with col4:
+        modo = st.radio("Exibição", ["Cartões", "Tabela"], key=f"{prefixo}_modo")
+
+    filtros = {
+        "data_inicio": periodo[0] if len(periodo) > 0 else None,
+        "data_fim": periodo[-1] if len(periodo) > 0 else None,
+        "placa": placa.strip(),
+    }
+    return filtros, tamanho, modo
+
+# Seletor de página; devolve o deslocamento da página escolhida
+def seletor_pagina(total, tamanho, prefixo):
+    paginas = max(1, -(-total // tamanho))
+    chave = f"{prefixo}_pagina"
+    if st.session_state.get(chave, 1) > paginas:
+        st.session_state[chave] = paginas
+    pagina = st.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, step=1, key=chave)
+    return (pagina - 1) * tamanho
+
 # Header principal
 st.markdown("<div class=\"main-header\">🚚 Suzano - Controle de Transferência de Carga</div>", unsafe_allow_html=True)
 
+# Seletor de rota, quando o app opera mais de uma. A troca espera as gravações
+# desta sessão serem confirmadas, porque cada rota tem a própria fila de escrita.
+if len(ROTAS) > 1:
+    st.selectbox("🏭 Rota (fábrica → CD)", ROTAS, key="rota", disabled=bool(st.session_state.escritas_enviadas),
+                 help="Cada rota tem os próprios registros")
+
 # TELA INICIAL COM BOTÕES
 if st.session_state.pagina_atual == "Tela Inicial":
     st.markdown("<div class=\"section-header\">📋 Escolha uma opção:</div>", unsafe_allow_html=True)
@@ -194,41 +268,79 @@ if st.session_state.pagina_atual == "Tela Inicial":
             st.session_state.pagina_atual = "Finalizadas"
             st.rerun()
     
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        if st.button("📈 ANÁLISES", key="btn_analises", help="Médias e percentis dos tempos por dia, semana, conferente e placa", use_container_width=True):
+            st.session_state.pagina_atual = "Análises"
+            st.rerun()
+    
+    with col2:
+        if st.button("📤 IMPORTAR PLANILHAS", key="btn_importar", help="Importar planilhas preenchidas fora do app", use_container_width=True):
+            st.session_state.pagina_atual = "Importar Planilhas"
+            st.rerun()
+    
+    if len(ROTAS) > 1:
+        if st.button("🌐 VISÃO GERAL DAS ROTAS", key="btn_visao_geral", help="Veículos em operação e atrasos de todas as rotas", use_container_width=True):
+            st.session_state.pagina_atual = "Visão Geral"
+            st.rerun()
+    
     # Seção de informações e download
     st.markdown("<div class=\"section-header\">📥 Download da Planilha</div>", unsafe_allow_html=True)
     
-    if os.path.exists(EXCEL_PATH):
-        with open(EXCEL_PATH, "rb") as f:
-            st.download_button(
-                label="📥 Baixar Planilha Atual",
-                data=f,
-                file_name=EXCEL_PATH,
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                use_container_width=True
-            )
+    if banco.existe():
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            periodo = st.date_input("📅 Período (vazio = tudo)", value=(), format="DD/MM/YYYY", key="exportacao_periodo")
+        with col2:
+            formato = st.radio("Formato", list(exportacao.formatos_exportacao), index=1, horizontal=True, key="exportacao_formato")
+        data_inicio = periodo[0] if len(periodo) > 0 else None
+        data_fim = periodo[-1] if len(periodo) > 0 else None
+        extensao, mime = exportacao.formatos_exportacao[formato]
+        nome_arquivo = os.path.splitext(EXCEL_PATH)[0]
+        if data_inicio:
+            nome_arquivo += f" {data_inicio:%Y-%m-%d} a {data_fim:%Y-%m-%d}"
+
+        # O arquivo só é gerado quando o botão é clicado, lendo o armazenamento em lotes
+        st.download_button(
+            label="📥 Baixar Planilha",
+            data=lambda: exportacao.exportar(banco, formato, data_inicio, data_fim),
+            file_name=nome_arquivo + extensao,
+            mime=mime,
+            use_container_width=True
+        )
     else:
         st.info("📋 Nenhuma planilha encontrada. Crie o primeiro registro para gerar a planilha.")
     
     # Estatísticas rápidas se houver dados
-    if os.path.exists(EXCEL_PATH):
+    if banco.existe():
         try:
-            df = pd.read_excel(EXCEL_PATH, sheet_name=SHEET_NAME, engine="openpyxl")
+            # Contagens mantidas a cada gravação: nenhum registro é carregado aqui
+            resumo = banco.resumo()
+            contagens = armazenamento.contagens_do_resumo(resumo)
+            hoje = datetime.now(FUSO_HORARIO).strftime("%Y-%m-%d")
             
             st.markdown("<div class=\"section-header\">📈 Resumo Rápido</div>", unsafe_allow_html=True)
             
-            col1, col2, col3 = st.columns(3)
+            col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                total_registros = len(df)
-                st.metric("📋 Total de Registros", total_registros)
+                st.metric("📋 Total de Registros", contagens["total"])
             
             with col2:
-                em_operacao = len(df[(pd.isna(df["Saída CD"])) | (df["Saída CD"] == "")])
-                st.metric("🚛 Em Operação", em_operacao)
+                st.metric("🚛 Em Operação", contagens["em_operacao"])
             
             with col3:
-                finalizadas = len(df[~(pd.isna(df["Saída CD"])) & (df["Saída CD"] != "")])
-                st.metric("✅ Finalizadas", finalizadas)
+                st.metric("✅ Finalizadas", contagens["finalizadas"])
+            
+            with col4:
+                st.metric("📅 Lançados Hoje", resumo.get("dia", {}).get(hoje, 0))
+            
+            # Veículos em cada etapa (campos_tempo), pela etapa atual de cada registro
+            etapas = resumo.get("etapa", {})
+            em_andamento = [f"{campo}: {etapas[campo]}" for campo in campos_tempo[:-1] if etapas.get(campo)]
+            if em_andamento:
+                st.caption("📍 " + " · ".join(em_andamento))
                 
         except Exception as e:
             st.warning("⚠️ Erro ao carregar estatísticas da planilha.")
@@ -252,36 +364,14 @@ elif st.session_state.pagina_atual == "Lançar Novo Controle":
     # Seção Fábrica
     st.markdown("<div class=\"section-header\">🏭 Registros da Fábrica</div>", unsafe_allow_html=True)
     
-    for i, campo in enumerate(campos_tempo[:7]):
-        col1, col2 = st.columns([3, 1])
-        with col1:
-            valor_atual = st.session_state[campo]
-            if valor_atual:
-                st.success(f"✅ {campo}: {valor_atual}")
-            else:
-                st.info(f"⏳ {campo}: Aguardando registro...")
-        with col2:
-            if st.button(f"📝 Registrar", key=f"btn_{campo}", help=f"Registrar {campo}"):
-                st.session_state[campo] = datetime.now(FUSO_HORARIO).strftime("%Y-%m-%d %H:%M:%S")
-                st.success(f"✅ {campo} registrado!")
-                st.rerun()
+    for campo in campos_tempo[:7]:
+        linha_horario(campo)
 
     # Seção CD
     st.markdown("<div class=\"section-header\">📦 Registros do Centro de Distribuição</div>", unsafe_allow_html=True)
     
     for campo in campos_tempo[7:]:
-        col1, col2 = st.columns([3, 1])
-        with col1:
-            valor_atual = st.session_state[campo]
-            if valor_atual:
-                st.success(f"✅ {campo}: {valor_atual}")
-            else:
-                st.info(f"⏳ {campo}: Aguardando registro...")
-        with col2:
-            if st.button(f"📝 Registrar", key=f"btn_{campo}", help=f"Registrar {campo}"):
-                st.session_state[campo] = datetime.now(FUSO_HORARIO).strftime("%Y-%m-%d %H:%M:%S")
-                st.success(f"✅ {campo} registrado!")
-                st.rerun()
+        linha_horario(campo)
 
     # Botão de salvar destacado
     st.markdown("---")
@@ -292,52 +382,23 @@ elif st.session_state.pagina_atual == "Lançar Novo Controle":
                 st.error("❌ Por favor, preencha a placa do caminhão e o nome do conferente!")
             else:
                 # Calcular os tempos antes de salvar
-                tempo_espera_doca = calcular_tempo(st.session_state.get("Entrada na Fábrica"), st.session_state.get("Encostou na doca Fábrica"))
-                tempo_total = calcular_tempo(st.session_state.get("Entrada na Fábrica"), st.session_state.get("Saída do pátio"))
-                tempo_descarregamento_cd = calcular_tempo(st.session_state.get("Início Descarregamento CD"), st.session_state.get("Fim Descarregamento CD"))
-                tempo_espera_doca_cd = calcular_tempo(st.session_state.get("Entrada CD"), st.session_state.get("Encostou na doca CD"))
-                tempo_total_cd = calcular_tempo(st.session_state.get("Entrada CD"), st.session_state.get("Saída CD"))
-                tempo_percurso_para_cd = calcular_tempo(st.session_state.get("Saída do pátio"), st.session_state.get("Entrada CD"))
-                tempo_carregamento = calcular_tempo(st.session_state.get("Início carregamento"), st.session_state.get("Fim carregamento"))
+                tempos = calcular_tempos(pd.DataFrame([{campo: st.session_state.get(campo) for campo in campos_tempo}])).iloc[0]
                 
                 nova_linha = {
                     "Data": data.strftime("%Y-%m-%d"),
                     "Placa do caminhão": placa,
                     "Nome do conferente": conferente,
                     **{campo: st.session_state[campo] for campo in campos_tempo},
-                    "Tempo Espera Doca": tempo_espera_doca,
-                    "Tempo Total": tempo_total,
-                    "Tempo de Descarregamento CD": tempo_descarregamento_cd,
-                    "Tempo Espera Doca CD": tempo_espera_doca_cd,
-                    "Tempo Total CD": tempo_total_cd,
-                    "Tempo Percurso Para CD": tempo_percurso_para_cd,
-                    "Tempo de Carregamento": tempo_carregamento
+                    **tempos.to_dict()
                 }
                 
                 try:
-                    if os.path.exists(EXCEL_PATH):
-                        df_existente = pd.read_excel(EXCEL_PATH, sheet_name=SHEET_NAME, engine="openpyxl")
-                        # Definir a ordem esperada das colunas
-                        colunas_esperadas = ["Data", "Placa do caminhão", "Nome do conferente"] + campos_tempo + campos_calculados
-                        
-                        # Adicionar colunas ausentes ao df_existente com valores vazios
-                        for col in colunas_esperadas:
-                            if col not in df_existente.columns:
-                                df_existente[col] = ""
-                        
-                        # Reordenar as colunas do df_existente
-                        df_existente = df_existente[colunas_esperadas]
-                        
-                        df_novo = pd.concat([df_existente, pd.DataFrame([nova_linha])], ignore_index=True)
-                    else:
-                        # Criar um DataFrame com todas as colunas esperadas, incluindo as calculadas
-                        colunas_iniciais = ["Data", "Placa do caminhão", "Nome do conferente"] + campos_tempo + campos_calculados
-                        df_novo = pd.DataFrame([nova_linha], columns=colunas_iniciais)
+                    # Anota a nova linha na fila de escrita e segue; a gravação acontece em segundo plano
+                    id_escrita = fila_escrita.inserir(nova_linha)
+                    st.session_state.escritas_enviadas[id_escrita] = f"Registro da placa {placa}"
 
-                    with pd.ExcelWriter(EXCEL_PATH, engine="openpyxl", mode="w") as writer:
-                        df_novo.to_excel(writer, sheet_name=SHEET_NAME, index=False)
-
-                    st.success("✅ Registro salvo com sucesso!")
+                    # A confirmação (ou o erro) chega como aviso quando a fila gravar
+                    st.info("📨 Registro enviado para gravação!")
                     
                     # Limpa campos depois de salvar
                     for campo in campos_tempo:
@@ -361,43 +422,59 @@ elif st.session_state.pagina_atual == "Editar Lançamentos Incompletos":
     botao_voltar()
     
     st.markdown("<div class=\"section-header\">✏️ Editar Registros Incompletos</div>", unsafe_allow_html=True)
+    
+    if "aviso_edicao" in st.session_state:
+        st.error(st.session_state.pop("aviso_edicao"))
 
-    if os.path.exists(EXCEL_PATH):
-        df = pd.read_excel(EXCEL_PATH, sheet_name=SHEET_NAME, engine="openpyxl")
-        incompletos = df[(pd.isna(df["Saída CD"])) | (df["Saída CD"] == "")]
+    if banco.existe():
+        incompletos = banco.registros_abertos()
 
         if not incompletos.empty:
             # Seleção mais visual
             st.info(f"📋 Encontrados {len(incompletos)} registros incompletos")
             
-            opcoes = []
-            for idx in incompletos.index:
-                placa = incompletos.loc[idx, 'Placa do caminhão']
-                data = incompletos.loc[idx, 'Data']
-                status = obter_status(incompletos.loc[idx])
-                opcoes.append(f"🚛 {placa} | 📅 {data} | 📍 {status}")
+            # As opções são os IDs dos registros; o texto exibido sai deste dicionário
+            rotulos = (
+                "🚛 " + incompletos['Placa do caminhão'].astype(str)
+                + " | 📅 " + incompletos['Data'].astype(str)
+                + " | 📍 " + incompletos[COLUNA_STATUS]
+            ).to_dict()
             
-            opcao_selecionada = st.selectbox("Selecione um registro para editar:", opcoes, key="select_edicao")
+            opcao_selecionada = st.selectbox("Selecione um registro para editar:", list(rotulos), format_func=rotulos.get, key="select_edicao")
             
             if opcao_selecionada:
-                # Extrair índice da opção selecionada
-                placa_selecionada = opcao_selecionada.split(" | ")[0].replace("🚛 ", "")
-                idx = incompletos[incompletos['Placa do caminhão'] == placa_selecionada].index[0]
+                idx = opcao_selecionada
                 
                 registro = incompletos.loc[idx]
+                colunas_registro = [
+                    coluna for coluna in incompletos.columns
+                    if coluna != COLUNA_STATUS and coluna not in colunas_controle
+                    and coluna not in campos_calculados and coluna not in campos_segundos.values()
+                ]
+                
+                # Trocou de registro: descarta o que foi digitado para o anterior
+                if st.session_state.get("edicao_id") != idx:
+                    for coluna in colunas_registro:
+                        st.session_state.pop(f"temp_edit_{coluna}", None)
+                    st.session_state.edicao_id = idx
+                
+                # Versão do registro quando a edição começou, para rejeitar alterações sobre dados velhos
+                chave_versao = f"versao_edicao_{idx}"
+                if chave_versao not in st.session_state:
+                    st.session_state[chave_versao] = armazenamento.versao_registro(registro)
                 
                 st.markdown(f'<div class="status-card status-info"><strong>Editando registro da placa: {registro["Placa do caminhão"]}</strong></div>', unsafe_allow_html=True)
                 
                 # Inicializa session_state para os campos editáveis se ainda não existirem
-                for coluna in df.columns:
+                for coluna in colunas_registro:
                     if f"temp_edit_{coluna}" not in st.session_state:
                         st.session_state[f"temp_edit_{coluna}"] = str(registro[coluna]) if not pd.isna(registro[coluna]) else ""
 
                 # Campos editáveis organizados por seção
                 campos_editaveis = []
-                for coluna in df.columns:
+                for coluna in colunas_registro:
                     valor = registro[coluna]
-                    if pd.isna(valor) or valor == "":
+                    if pd.isna(valor):
                         campos_editaveis.append(coluna)
 
                 if campos_editaveis:
@@ -417,19 +494,24 @@ elif st.session_state.pagina_atual == "Editar Lançamentos Incompletos":
                     col1, col2, col3 = st.columns([1, 2, 1])
                     with col2:
                         if st.button("💾 SALVAR ALTERAÇÕES", key="btn_salvar_edicao", use_container_width=True):
-                            for coluna in df.columns:
-                                if pd.isna(registro[coluna]) or registro[coluna] == "":
+                            valores = {}
+                            for coluna in colunas_registro:
+                                if pd.isna(registro[coluna]):
                                     novo_valor = st.session_state[f"temp_edit_{coluna}"]
-                                    if novo_valor.strip() != "":
-                                        df.at[idx, coluna] = novo_valor
-
-                            with pd.ExcelWriter(EXCEL_PATH, engine="openpyxl", mode="w") as writer:
-                                df.to_excel(writer, sheet_name=SHEET_NAME, index=False)
+                                    if novo_valor.strip():
+                                        valores[coluna] = novo_valor
 
-                            st.success("✅ Registro atualizado com sucesso!")
+                            if valores:
+                                # A alteração vai para a fila de escrita; um conflito de versão é avisado quando ela for aplicada
+                                id_escrita = fila_escrita.atualizar(idx, valores, versao_esperada=st.session_state[chave_versao])
+                                st.session_state.escritas_enviadas[id_escrita] = f"Registro da placa {registro['Placa do caminhão']}"
+                                # Uma nova edição deste registro parte da versão que esta alteração vai gravar
+                                st.session_state[chave_versao] += 1
+                                # O st.rerun() abaixo apagaria um st.info; o aviso aparece na próxima execução
+                                st.session_state.avisos_escrita.append("📨 Alteração enviada para gravação!")
                             
                             # Limpa os campos editáveis do session_state
-                            for coluna in df.columns:
+                            for coluna in colunas_registro:
                                 if f"temp_edit_{coluna}" in st.session_state:
                                     del st.session_state[f"temp_edit_{coluna}"]
                             
@@ -447,9 +529,15 @@ elif st.session_state.pagina_atual == "Em Operação":
     
     st.markdown("<div class=\"section-header\">🚛 Registros em Operação</div>", unsafe_allow_html=True)
     
-    if os.path.exists(EXCEL_PATH):
-        df = pd.read_excel(EXCEL_PATH, sheet_name=SHEET_NAME, engine="openpyxl")
-        em_operacao = df[(pd.isna(df["Saída CD"])) | (df["Saída CD"] == "")]
+    # O painel se atualiza sozinho a cada INTERVALO_PAINEL segundos, sem refazer a
+    # página: a visão compartilhada recebe só as alterações gravadas desde a última
+    # leitura, e os cartões que mudaram desde a atualização anterior ganham 🔄
+    @st.fragment(run_every=INTERVALO_PAINEL)
+    def painel_operacao():
+        chave_visto = f"painel_visto_{st.session_state.rota}"
+        em_operacao, alterados, st.session_state[chave_visto] = painel.obter_painel(banco).atualizar(
+            st.session_state.get(chave_visto)
+        )
         
         if not em_operacao.empty:
             # Métricas em cards visuais
@@ -457,19 +545,47 @@ elif st.session_state.pagina_atual == "Em Operação":
             with col1:
                 st.metric("🚚 Veículos em Operação", len(em_operacao))
             with col2:
-                na_fabrica = len(em_operacao[pd.isna(em_operacao["Entrada CD"]) | (em_operacao["Entrada CD"] == "")])
+                no_cd = int(em_operacao[COLUNA_STATUS].isin(campos_tempo[7:]).sum())
+                na_fabrica = len(em_operacao) - no_cd
                 st.metric("🏭 Na Fábrica", na_fabrica)
             with col3:
-                no_cd = len(em_operacao) - na_fabrica
                 st.metric("📦 No CD", no_cd)
             
+            # Alertas de atraso: veículos parados na etapa além de limites_etapa_minutos,
+            # reavaliados a cada atualização do painel
+            atrasos = detectar_atrasos(em_operacao, datetime.now(FUSO_HORARIO))
+            if not atrasos.empty:
+                st.markdown("<div class=\"section-header\">🚨 Alertas de Atraso</div>", unsafe_allow_html=True)
+                st.error(f"🚨 {len(atrasos)} veículo(s) parado(s) além do limite da etapa")
+                alertas = atrasos.join(em_operacao[["Placa do caminhão", "Nome do conferente"]])
+                alertas["Desde"] = alertas["Desde"].dt.strftime("%d/%m %H:%M")
+                st.dataframe(
+                    alertas[["Placa do caminhão", "Nome do conferente", "Etapa", "Aguardando", "Desde",
+                             "Parado (min)", "Limite (min)", "Excesso (min)"]],
+                    hide_index=True, use_container_width=True
+                )
+            
             st.markdown("---")
             
+            filtros, tamanho, modo = filtros_lista("operacao")
+            filtrados = armazenamento.filtrar_registros(em_operacao, **filtros)
+            total_filtrado = len(filtrados)
+            deslocamento = seletor_pagina(total_filtrado, tamanho, "operacao")
+            pagina = filtrados.iloc[deslocamento:deslocamento + tamanho]
+            st.caption(f"{total_filtrado} registro(s) encontrado(s)")
+            
+            if modo == "Tabela":
+                st.dataframe(
+                    pagina[["Placa do caminhão", "Nome do conferente", "Data", COLUNA_STATUS,
+                            "Tempo Espera Doca", "Tempo Total", "Tempo Percurso Para CD"]],
+                    hide_index=True, use_container_width=True
+                )
+            
             # Cards de veículos mais visuais
-            for idx in em_operacao.index:
-                registro = em_operacao.loc[idx]
+            for idx in (pagina.index if modo == "Cartões" else []):
+                registro = pagina.loc[idx]
                 placa = registro.get('Placa do caminhão', 'N/A')
-                status = obter_status(registro)
+                status = registro[COLUNA_STATUS]
                 conferente = registro.get('Nome do conferente', 'N/A')
                 
                 # Determinar cor e ícone do status
@@ -486,7 +602,8 @@ elif st.session_state.pagina_atual == "Em Operação":
                     status_color = "info"
                     status_icon = "⚪"
                 
-                with st.expander(f"{status_icon} **{placa}** - {status}", expanded=False):
+                marcador = (" 🚨" if idx in atrasos.index else "") + (" 🔄" if idx in alterados else "")
+                with st.expander(f"{status_icon} **{placa}** - {status}{marcador}", expanded=False):
                     col1, col2 = st.columns(2)
                     
                     with col1:
@@ -495,10 +612,10 @@ elif st.session_state.pagina_atual == "Em Operação":
                         st.write(f"**📍 Status Atual:** {status}")
                     
                     with col2:
-                        # Tempos calculados
-                        tempo_espera_doca = calcular_tempo(registro.get("Entrada na Fábrica"), registro.get("Encostou na doca Fábrica"))
-                        tempo_total = calcular_tempo(registro.get("Entrada na Fábrica"), registro.get("Saída do pátio"))
-                        tempo_percurso_para_cd = calcular_tempo(registro.get("Saída do pátio"), registro.get("Entrada CD"))
+                        # Tempos calculados (já preenchidos na carga)
+                        tempo_espera_doca = registro.get("Tempo Espera Doca")
+                        tempo_total = registro.get("Tempo Total")
+                        tempo_percurso_para_cd = registro.get("Tempo Percurso Para CD")
                         
                         if tempo_espera_doca:
                             st.metric("⏱️ Tempo Espera Doca", tempo_espera_doca)
@@ -521,13 +638,16 @@ elif st.session_state.pagina_atual == "Em Operação":
                     progress_cols = st.columns(6)
                     for i, (evento, timestamp) in enumerate(eventos):
                         with progress_cols[i]:
-                            if timestamp and not pd.isna(timestamp) and timestamp != "":
+                            if pd.notna(timestamp):
                                 st.success(f"✅ {evento}")
                             else:
                                 st.info(f"⏳ {evento}")
             
         else:
             st.info("📋 Nenhum registro em operação no momento.")
+
+    if banco.existe():
+        painel_operacao()
     else:
         st.error("❌ Planilha não encontrada.")
 
@@ -537,26 +657,40 @@ elif st.session_state.pagina_atual == "Finalizadas":
     
     st.markdown("<div class=\"section-header\">✅ Registros Finalizados</div>", unsafe_allow_html=True)
     
-    if os.path.exists(EXCEL_PATH):
-        df = pd.read_excel(EXCEL_PATH, sheet_name=SHEET_NAME, engine="openpyxl")
-        finalizados = df[~(pd.isna(df["Saída CD"])) & (df["Saída CD"] != "")]
+    if banco.existe():
+        contagens = banco.contagens()
+        total_finalizadas = contagens["finalizadas"]
+        total_registros = contagens["total"]
         
-        if not finalizados.empty:
+        if total_finalizadas > 0:
             # Métricas
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("✅ Cargas Finalizadas", len(finalizados))
+                st.metric("✅ Cargas Finalizadas", total_finalizadas)
             with col2:
-                st.metric("📊 Total de Registros", len(df))
+                st.metric("📊 Total de Registros", total_registros)
             with col3:
-                percentual = round((len(finalizados) / len(df)) * 100, 1) if len(df) > 0 else 0
+                percentual = round((total_finalizadas / total_registros) * 100, 1) if total_registros > 0 else 0
                 st.metric("📈 % Finalizadas", f"{percentual}%")
             
             st.markdown("---")
             
+            filtros, tamanho, modo = filtros_lista("finalizadas")
+            _, total_filtrado = banco.consultar("finalizados", **filtros, limite=0)
+            deslocamento = seletor_pagina(total_filtrado, tamanho, "finalizadas")
+            pagina, _ = banco.consultar("finalizados", **filtros, limite=tamanho, deslocamento=deslocamento, recentes_primeiro=True)
+            st.caption(f"{total_filtrado} registro(s) encontrado(s)")
+            
+            if modo == "Tabela":
+                st.dataframe(
+                    pagina[["Placa do caminhão", "Nome do conferente", "Data", "Saída CD",
+                            "Tempo Total", "Tempo Percurso Para CD", "Tempo Total CD"]],
+                    hide_index=True, use_container_width=True
+                )
+            
             # Lista de finalizados mais compacta
-            for idx in finalizados.index:
-                registro = finalizados.loc[idx]
+            for idx in (pagina.index if modo == "Cartões" else []):
+                registro = pagina.loc[idx]
                 placa = registro.get("Placa do caminhão", "N/A")
                 conferente = registro.get("Nome do conferente", "N/A")
                 data_saida = registro.get("Saída CD", "N/A")
@@ -570,10 +704,10 @@ elif st.session_state.pagina_atual == "Finalizadas":
                         st.write(f"**🏁 Finalizada:** {data_saida}")
                     
                     with col2:
-                        # Tempos calculados
-                        tempo_total = calcular_tempo(registro.get("Entrada na Fábrica"), registro.get("Saída do pátio"))
-                        tempo_percurso = calcular_tempo(registro.get("Saída do pátio"), registro.get("Entrada CD"))
-                        tempo_total_cd = calcular_tempo(registro.get("Entrada CD"), registro.get("Saída CD"))
+                        # Tempos calculados (já preenchidos na carga)
+                        tempo_total = registro.get("Tempo Total")
+                        tempo_percurso = registro.get("Tempo Percurso Para CD")
+                        tempo_total_cd = registro.get("Tempo Total CD")
                         
                         if tempo_total:
                             st.metric("⏰ Tempo Total Fábrica", tempo_total)
@@ -587,3 +721,124 @@ elif st.session_state.pagina_atual == "Finalizadas":
     else:
         st.error("❌ Planilha não encontrada.")
 
+# ANÁLISES
+elif st.session_state.pagina_atual == "Análises":
+    botao_voltar()
+    
+    st.markdown("<div class=\"section-header\">📈 Análises dos Tempos</div>", unsafe_allow_html=True)
+    
+    if banco.existe():
+        col1, col2 = st.columns(2)
+        with col1:
+            agrupamento = st.selectbox("📊 Agrupar por", list(agrupamentos_analise), format_func=agrupamentos_analise.get, key="analise_agrupamento")
+        with col2:
+            campo = st.selectbox("⏱️ Tempo", campos_analise, key="analise_campo")
+        
+        # Estatísticas a partir dos histogramas mantidos a cada gravação, sem carregar registros
+        estatisticas = armazenamento.estatisticas_rollup(
+            banco.rollups(agrupamento, campo), banco.rollups(agrupamento, campo, segundos=True)
+        )
+        
+        if not estatisticas.empty:
+            if agrupamento in ("conferente", "placa"):
+                estatisticas = estatisticas.sort_values("registros", ascending=False)
+            
+            grafico = (estatisticas[["media", "mediana", "p90"]] / 60).rename(
+                columns={"media": "Média (min)", "mediana": "Mediana (min)", "p90": "P90 (min)"}
+            )
+            if agrupamento in ("dia", "semana"):
+                st.line_chart(grafico)
+            else:
+                st.bar_chart(grafico.head(30))
+            
+            tabela = pd.DataFrame({
+                agrupamentos_analise[agrupamento]: estatisticas.index,
+                "Registros": estatisticas["registros"].to_numpy(),
+                "Média": formatar_duracao(estatisticas["media"]).to_numpy(),
+                "Mediana": formatar_duracao(estatisticas["mediana"]).to_numpy(),
+                "P90": formatar_duracao(estatisticas["p90"]).to_numpy(),
+            })
+            st.dataframe(tabela, hide_index=True, use_container_width=True)
+        else:
+            st.info(f"📋 Nenhum registro com {campo} calculado.")
+    else:
+        st.error("❌ Planilha não encontrada.")
+
+# IMPORTAR PLANILHAS
+elif st.session_state.pagina_atual == "Importar Planilhas":
+    botao_voltar()
+    
+    st.markdown("<div class=\"section-header\">📤 Importar Planilhas</div>", unsafe_allow_html=True)
+    st.info("📋 Envie planilhas .xlsx ou .csv no formato da planilha de controle. Registros com a mesma placa e a mesma \"Entrada na Fábrica\" de um registro existente são ignorados.")
+    
+    arquivos = st.file_uploader("Planilhas", type=["xlsx", "csv"], accept_multiple_files=True, key="arquivos_importacao")
+    
+    if arquivos:
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col2:
+            if st.button("📤 IMPORTAR", key="btn_confirmar_importacao", use_container_width=True):
+                try:
+                    resultado = importacao.importar_arquivos(banco, arquivos)
+                    st.success(f"✅ {resultado['importados']} registros importados de {resultado['lidos']} linhas lidas ({resultado['duplicados']} duplicados ignorados).")
+                except Exception as e:
+                    st.error(f"❌ Erro ao importar: {e}")
+
+# VISÃO GERAL (todas as rotas)
+elif st.session_state.pagina_atual == "Visão Geral":
+    botao_voltar()
+    
+    st.markdown("<div class=\"section-header\">🌐 Visão Geral das Rotas</div>", unsafe_allow_html=True)
+    
+    # Cada rota é lida em paralelo, no próprio armazenamento (ver armazenamento.ler_rotas)
+    contagens = armazenamento.ler_rotas(
+        lambda banco_rota: banco_rota.contagens() if banco_rota.existe() else {"total": 0, "em_operacao": 0, "finalizadas": 0}
+    )
+    abertos = armazenamento.abertos_de_todas_as_rotas().reset_index(drop=True)
+    if abertos.empty:
+        atrasos = pd.DataFrame(columns=["Rota"])
+    else:
+        atrasos = detectar_atrasos(abertos, datetime.now(FUSO_HORARIO)).join(abertos[["Rota", "Placa do caminhão", "Nome do conferente"]])
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("🚚 Veículos em Operação", sum(contagem["em_operacao"] for contagem in contagens.values()))
+    with col2:
+        st.metric("✅ Cargas Finalizadas", sum(contagem["finalizadas"] for contagem in contagens.values()))
+    with col3:
+        st.metric("🚨 Atrasados", len(atrasos))
+    
+    por_rota = pd.DataFrame.from_dict(contagens, orient="index")
+    por_rota["atrasados"] = atrasos["Rota"].value_counts().reindex(por_rota.index, fill_value=0)
+    por_rota = por_rota.rename(columns={"total": "Total", "em_operacao": "Em Operação", "finalizadas": "Finalizadas", "atrasados": "Atrasados"})
+    st.dataframe(por_rota.rename_axis("Rota"), use_container_width=True)
+    
+    if not atrasos.empty:
+        st.markdown("<div class=\"section-header\">🚨 Alertas de Atraso</div>", unsafe_allow_html=True)
+        atrasos["Desde"] = atrasos["Desde"].dt.strftime("%d/%m %H:%M")
+        st.dataframe(
+            atrasos[["Rota", "Placa do caminhão", "Nome do conferente", "Etapa", "Aguardando", "Desde",
+                     "Parado (min)", "Limite (min)", "Excesso (min)"]],
+            hide_index=True, use_container_width=True
+        )
+    
+    if not abertos.empty:
+        st.markdown("<div class=\"section-header\">🚛 Em Operação em Todas as Rotas</div>", unsafe_allow_html=True)
+        st.dataframe(
+            abertos[["Rota", "Placa do caminhão", "Nome do conferente", "Data", COLUNA_STATUS,
+                     "Tempo Espera Doca", "Tempo Total", "Tempo Percurso Para CD"]],
+            hide_index=True, use_container_width=True
+        )
+    else:
+        st.info("📋 Nenhum registro em operação no momento.")
+
+# Fecha a medição desta execução e mostra o painel de administração (ADMIN=1 ou ?admin=1)
+if medicao is not None:
+    medicao.finalizar()
+    if ADMIN or st.query_params.get("admin") == "1":
+        with st.sidebar:
+            st.markdown("### ⏱️ Desempenho")
+            st.caption(f"{medicao.pagina}: {medicao.total * 1000:.0f} ms nesta execução")
+            st.dataframe(medicao.tabela(), use_container_width=True)
+            st.caption(f"Cache: {medicao.cache['acertos']} acerto(s), {medicao.cache['falhas']} falha(s)")
+            st.markdown("**Média por página (ms, últimas execuções)**")
+            st.dataframe(metricas.resumo_paginas(metricas.ultimas()), use_container_width=True)
@@ -0,0 +1,1479 @@
+import hashlib
+import itertools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+import metricas
+from calculos import (
+    COLUNA_STATUS, calcular_status, calcular_tempos, preparar_registros, tipar_registros,
+    horarios, horarios_em_texto, registros_em_texto
+)
+from config import (
+    ARMAZENAMENTO, EXCEL_PATH, SHEET_NAME, JOURNAL_PATH, COMPACTAR_A_CADA, DB_PATH,
+    ARQUIVO_DIR, JANELA_ARQUIVO_DIAS, INTERVALO_ARQUIVAMENTO, FUSO_HORARIO, TEMPO_ESPERA_TRAVA, LOTE_EXPORTACAO,
+    ALTERACOES_MANTIDAS, ROTAS, ROTAS_DIR, LEITURAS_PARALELAS,
+    COLUNA_ID, COLUNA_VERSAO, campos_tempo, campos_segundos, campos_analise, colunas_armazenadas
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# Outro conferente alterou o registro depois que ele foi aberto para edição
+class RegistroDesatualizado(Exception):
+    pass
+
+
+# Trava exclusiva entre processos, num arquivo .lock ao lado dos dados.
+# É reentrante dentro da mesma thread.
+class TravaArquivo:
+    _em_uso = threading.local()
+
+    def __init__(self, caminho, tempo_espera=TEMPO_ESPERA_TRAVA):
+        self.caminho = caminho
+        self.tempo_espera = tempo_espera
+        self._arquivo = None
+        self._reentrada = False
+
+    def _travas_da_thread(self):
+        if not hasattr(self._em_uso, "caminhos"):
+            self._em_uso.caminhos = set()
+        return self._em_uso.caminhos
+
+    def _tentar(self):
+        try:
+            if fcntl:
+                fcntl.flock(self._arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(self._arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def __enter__(self):
+        if self.caminho in self._travas_da_thread():
+            self._reentrada = True
+            return self
+        self._arquivo = open(self.caminho, "a+")
+        limite = time.monotonic() + self.tempo_espera
+        while not self._tentar():
+            if time.monotonic() > limite:
+                self._arquivo.close()
+                raise TimeoutError(f"Não foi possível travar {self.caminho}")
+            time.sleep(0.01)
+        self._travas_da_thread().add(self.caminho)
+        return self
+
+    def __exit__(self, *exc):
+        if self._reentrada:
+            return
+        self._travas_da_thread().discard(self.caminho)
+        if fcntl:
+            fcntl.flock(self._arquivo.fileno(), fcntl.LOCK_UN)
+        else:
+            self._arquivo.seek(0)
+            msvcrt.locking(self._arquivo.fileno(), msvcrt.LK_UNLCK, 1)
+        self._arquivo.close()
+
+
+def _versao(valor):
+    try:
+        return int(float(valor))
+    except (TypeError, ValueError):
+        return 0
+
+
+# Versão atual de um registro carregado (0 para registros de antes do controle de versão)
+def versao_registro(registro):
+    return _versao(registro.get(COLUNA_VERSAO))
+
+
+# ID único e permanente de um registro, gerado na criação
+def novo_id():
+    return uuid.uuid4().hex
+
+
+# Vazios de colunas ainda em texto (planilha, journal, importação): NaN ou ""
+def _mascara_vazios(serie):
+    return pd.isna(serie) | (serie.astype(object) == "")
+
+
+def _mascara_vazios_frame(df):
+    return df.isna() | (df.astype(object) == "")
+
+
+# Um registro está em aberto enquanto não tiver "Saída CD" (DataFrame tipado)
+def mascara_abertos(df):
+    return df["Saída CD"].isna()
+
+
+# Cache de leituras compartilhado por todas as sessões e reruns do processo.
+# Cada entrada guarda a assinatura dos arquivos (mtime/tamanho) e a geração
+# de escrita do seu prefixo (os dois primeiros itens da chave, ex.
+# ("excel", caminho)); as gravações do próprio app chamam invalidar(prefixo),
+# que só descarta as entradas daquele armazenamento.
+# Uma chave que falta é carregada uma vez só: quem pede a mesma chave (e a
+# mesma assinatura) enquanto ela carrega espera e recebe o mesmo resultado.
+# Os DataFrames devolvidos são compartilhados e não devem ser alterados.
+class CacheCarregamento:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entradas = {}
+        self._carregando = {}
+        self._geracoes = {}
+        self.geracao = 0
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, chave, assinatura, carregar):
+        while True:
+            with self._lock:
+                geracao = self._geracao(chave[:2])
+                entrada = self._entradas.get(chave)
+                if entrada is not None and entrada[0] == (assinatura, geracao):
+                    self.acertos += 1
+                    metricas.contar_cache(True)
+                    return entrada[1]
+                marca = (chave, assinatura, geracao)
+                carregando = self._carregando.get(marca)
+                if carregando is None:
+                    carregando = self._carregando[marca] = threading.Event()
+                    self.falhas += 1
+                    break
+            # Outra thread já está lendo: espera e confere o cache de novo
+            # (se a leitura falhou ou houve gravação no meio, alguém lê outra vez)
+            carregando.wait()
+        metricas.contar_cache(False)
+
+        try:
+            with metricas.etapa("load"):
+                valor = carregar()
+                if isinstance(valor, pd.DataFrame):
+                    metricas.contar(linhas=len(valor))
+            with self._lock:
+                # Uma gravação durante a leitura deixa o resultado fora do cache
+                if geracao == self._geracao(chave[:2]):
+                    self._entradas[chave] = ((assinatura, geracao), valor)
+        finally:
+            with self._lock:
+                del self._carregando[marca]
+            carregando.set()
+        return valor
+
+    # Geração do prefixo combinada com a geral (chamar com o lock)
+    def _geracao(self, prefixo):
+        return (self.geracao, self._geracoes.get(prefixo, 0))
+
+    # Valor guardado para a chave se ainda vale para a assinatura; não carrega nada
+    def em_cache(self, chave, assinatura):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada[0] == (assinatura, self._geracao(chave[:2])):
+                return entrada[1]
+        return None
+
+    # Sem prefixo, descarta tudo (usado pelos benchmarks para medir leituras frias)
+    def invalidar(self, prefixo=None):
+        with self._lock:
+            if prefixo is None:
+                self.geracao += 1
+                self._entradas.clear()
+                return
+            self._geracoes[prefixo] = self._geracoes.get(prefixo, 0) + 1
+            for chave in [chave for chave in self._entradas if chave[:2] == prefixo]:
+                del self._entradas[chave]
+
+    # Depois de uma gravação, guarda o valor já atualizado de uma chave
+    # (as demais entradas do mesmo prefixo são invalidadas, como em invalidar())
+    def substituir(self, chave, assinatura, valor):
+        self.invalidar(chave[:2])
+        with self._lock:
+            self._entradas[chave] = ((assinatura, self._geracao(chave[:2])), valor)
+
+    def estatisticas(self):
+        with self._lock:
+            return {"acertos": self.acertos, "falhas": self.falhas, "geracao": self.geracao}
+
+
+cache = CacheCarregamento()
+
+
+def _assinatura_arquivos(*caminhos):
+    assinatura = []
+    for caminho in caminhos:
+        try:
+            info = os.stat(caminho)
+            assinatura.append((info.st_mtime_ns, info.st_size))
+        except FileNotFoundError:
+            assinatura.append(None)
+    return tuple(assinatura)
+
+
+# Limite superior exclusivo para filtrar a coluna "Data" (texto AAAA-MM-DD...)
+def _dia_seguinte(data):
+    return (pd.Timestamp(data) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+# Data (AAAA-MM-DD) a partir da qual os registros finalizados ficam no conjunto de trabalho
+def data_corte_arquivo(hoje=None):
+    hoje = hoje or datetime.now(FUSO_HORARIO).date()
+    return (pd.Timestamp(hoje) - pd.Timedelta(days=JANELA_ARQUIVO_DIAS)).strftime("%Y-%m-%d")
+
+
+# Registros com "Data" dentro do período (datas inclusivas; None deixa o lado aberto)
+def _mascara_periodo(df, data_inicio=None, data_fim=None):
+    mascara = pd.Series(True, index=df.index)
+    datas = df["Data"].astype(str)
+    if data_inicio:
+        mascara &= datas >= pd.Timestamp(data_inicio).strftime("%Y-%m-%d")
+    if data_fim:
+        mascara &= datas < _dia_seguinte(data_fim)
+    return mascara
+
+
+# Filtros das listas (período e parte da placa) sobre um DataFrame carregado
+def filtrar_registros(df, data_inicio=None, data_fim=None, placa=""):
+    mascara = _mascara_periodo(df, data_inicio, data_fim)
+    if placa:
+        mascara &= df["Placa do caminhão"].astype(str).str.contains(placa, case=False, regex=False)
+    return df[mascara]
+
+
+# Partições mensais (AAAA-MM) que podem ter registros do período pedido
+def _particoes_no_periodo(meses, data_inicio=None, data_fim=None):
+    inicio = pd.Timestamp(data_inicio).strftime("%Y-%m") if data_inicio else None
+    fim = pd.Timestamp(data_fim).strftime("%Y-%m") if data_fim else None
+    return sorted(
+        mes for mes in meses
+        if (inicio is None or mes >= inicio) and (fim is None or mes <= fim)
+    )
+
+
+def _completar_colunas(df):
+    for col in colunas_armazenadas:
+        if col not in df.columns:
+            df[col] = ""
+    return df
+
+
+# Registros antigos, de antes dos IDs estáveis, recebem um ID novo
+def _preencher_ids(df):
+    sem_id = _mascara_vazios(df[COLUNA_ID])
+    if sem_id.any():
+        df.loc[sem_id, COLUNA_ID] = [novo_id() for _ in range(int(sem_id.sum()))]
+    return df
+
+
+# Linhas ainda sem nenhuma duração em segundos (planilhas de antes de campos_segundos):
+# os campos_calculados são refeitos a partir dos horários. Os horários ficam como estão.
+def _completar_tempos(df):
+    sem_segundos = _mascara_vazios_frame(df[list(campos_segundos.values())]).all(axis=1)
+    if sem_segundos.any():
+        for nome, coluna in calcular_tempos(df[sem_segundos]).items():
+            # Colunas criadas vazias por _completar_colunas são de texto e não aceitariam os segundos
+            df[nome] = df[nome].astype(object)
+            df.loc[sem_segundos, nome] = coluna.astype(object)
+    return df
+
+
+# Valores de uma alteração somados aos campos_calculados da linha, refeitos com eles
+def _com_tempos(registro, valores):
+    linha = pd.DataFrame([{**dict(registro), **valores}])
+    return {**valores, **calcular_tempos(linha).iloc[0].to_dict()}
+
+
+# Contagens de um conjunto de registros por situação, por etapa (campos_tempo) e por dia.
+# O resumo guardado por cada backend soma e subtrai estas contagens a cada escrita.
+def resumo_de(df):
+    df = tipar_registros(_completar_colunas(df.copy()))
+    situacao = mascara_abertos(df).map({True: "em_operacao", False: "finalizadas"})
+    dias = df["Data"].fillna("").str[:10]
+    return {
+        "situacao": situacao.value_counts().to_dict(),
+        "etapa": calcular_status(df).value_counts().to_dict(),
+        "dia": dias.value_counts().to_dict(),
+    }
+
+
+def _somar_resumo(resumo, parcela, sinal=1):
+    for dimensao, contagens in parcela.items():
+        destino = resumo.setdefault(dimensao, {})
+        for valor, total in contagens.items():
+            total = destino.get(valor, 0) + sinal * int(total)
+            if total:
+                destino[valor] = total
+            else:
+                destino.pop(valor, None)
+    return resumo
+
+
+def contagens_do_resumo(resumo):
+    situacao = resumo.get("situacao", {})
+    abertos = situacao.get("em_operacao", 0)
+    finalizadas = situacao.get("finalizadas", 0)
+    return {"total": abertos + finalizadas, "em_operacao": abertos, "finalizadas": finalizadas}
+
+
+# Chave de cada agrupamento da página de análises ("" quando não há)
+def _chaves_analise(df):
+    dias = df["Data"].fillna("").str[:10]
+    datas = pd.to_datetime(dias, format="%Y-%m-%d", errors="coerce")
+    semana = datas.dt.isocalendar()
+    semanas = (semana["year"].astype(str) + "-S" + semana["week"].astype(str).str.zfill(2)).where(datas.notna(), "")
+    return {
+        "dia": dias.where(datas.notna(), ""),
+        "semana": semanas.astype(object),
+        "conferente": df["Nome do conferente"].astype(object).fillna("").astype(str),
+        "placa": df["Placa do caminhão"].astype(object).fillna("").astype(str),
+    }
+
+
+# Histogramas por minuto das durações de campos_analise, para cada agrupamento.
+# Dimensão "agrupamento|campo", valor "chave|minuto": os percentis da página de
+# análises saem destas contagens, sem reler os registros. A dimensão
+# "agrupamento|campo|segundos" soma os segundos de cada chave, para a média exata.
+def rollups_de(df):
+    df = tipar_registros(_completar_colunas(df.copy()))
+    tempos = calcular_tempos(df)
+    rollups = {}
+    for agrupamento, chaves in _chaves_analise(df).items():
+        for campo in campos_analise:
+            segundos = tempos[campos_segundos[campo]]
+            validos = (chaves != "") & segundos.notna()
+            if not validos.any():
+                continue
+            minutos = np.floor_divide(segundos[validos], 60).astype("int64")
+            valores = chaves[validos] + "|" + minutos.astype(str)
+            rollups[f"{agrupamento}|{campo}"] = valores.value_counts().to_dict()
+            somas = segundos[validos].round().astype("int64").groupby(chaves[validos]).sum()
+            rollups[f"{agrupamento}|{campo}|segundos"] = somas.to_dict()
+    return rollups
+
+
+# Resumos mantidos pelos backends a cada escrita, com a função que conta um conjunto de registros.
+# Mudar o que uma função conta pede uma versão nova: os resumos gravados são refeitos.
+_resumos = {"resumo": resumo_de, "rollups": rollups_de}
+_versoes_resumos = {"resumo": 1, "rollups": 2}
+
+
+# Tabelas de contagens (resumo, rollups) dos dois backends: uma linha por dimensão e valor
+def _criar_tabela_contagens(conn, nome):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {nome} (dimensao TEXT, valor TEXT, total INTEGER NOT NULL, PRIMARY KEY (dimensao, valor))")
+
+
+# Soma uma parcela às contagens; só as chaves tocadas que zeraram são apagadas
+def _somar_contagens(conn, nome, parcela):
+    linhas = [(dimensao, str(valor), int(total)) for dimensao, contagens in parcela.items() for valor, total in contagens.items()]
+    conn.executemany(
+        f"INSERT INTO {nome} (dimensao, valor, total) VALUES (?, ?, ?) "
+        "ON CONFLICT (dimensao, valor) DO UPDATE SET total = total + excluded.total",
+        linhas,
+    )
+    conn.executemany(f"DELETE FROM {nome} WHERE dimensao = ? AND valor = ? AND total = 0", [linha[:2] for linha in linhas])
+
+
+# Contagens de uma tabela como {dimensao: {valor: total}}, ou só {valor: total} de uma dimensão
+def _ler_contagens(conn, nome, dimensao=None):
+    if dimensao is not None:
+        return dict(conn.execute(f"SELECT valor, total FROM {nome} WHERE dimensao = ?", (dimensao,)))
+    contagens = {}
+    for dimensao, valor, total in conn.execute(f"SELECT dimensao, valor, total FROM {nome}"):
+        contagens.setdefault(dimensao, {})[valor] = total
+    return contagens
+
+
+def _dimensao_rollup(agrupamento, campo, segundos=False):
+    return f"{agrupamento}|{campo}|segundos" if segundos else f"{agrupamento}|{campo}"
+
+
+# Diferença num resumo quando um registro passa de "anterior" para "novo"
+def _variacao_resumo(anterior, novo, contar=resumo_de):
+    variacao = _somar_resumo({}, contar(pd.DataFrame([dict(novo)])))
+    return _somar_resumo(variacao, contar(pd.DataFrame([dict(anterior)])), -1)
+
+
+# Valores gravados por uma alteração de um registro em texto (tempos refeitos e
+# versão avançada `alteracoes` vezes) e a variação de cada resumo de _resumos
+def _preparar_alteracao(registro, valores, alteracoes=1):
+    valores = {**_com_tempos(registro, valores), COLUNA_VERSAO: _versao(registro[COLUNA_VERSAO]) + alteracoes}
+    novo = {**registro, **valores}
+    return valores, {nome: _variacao_resumo(registro, novo, contar) for nome, contar in _resumos.items()}
+
+
+# Média, mediana e p90 (em segundos) de um histograma de rollups_de. Com as somas
+# de segundos a média é exata; mediana e p90 têm resolução de minuto.
+@metricas.cronometrar("compute")
+def estatisticas_rollup(contagens, segundos=None):
+    colunas = ["registros", "media", "mediana", "p90"]
+    if not contagens:
+        return pd.DataFrame(columns=colunas)
+    chaves, minutos = zip(*(valor.rsplit("|", 1) for valor in contagens))
+    df = pd.DataFrame({"chave": chaves, "minuto": np.array(minutos, dtype="int64"), "total": list(contagens.values())})
+    df = df.sort_values(["chave", "minuto"])
+    grupos = df.groupby("chave", sort=True)
+    acumulado = grupos["total"].cumsum()
+    registros = grupos["total"].transform("sum")
+
+    def percentil(fracao):
+        # Primeiro minuto em que o acumulado alcança a fração pedida dos registros
+        alcancou = df[acumulado >= fracao * registros]
+        return alcancou.groupby("chave")["minuto"].first() * 60
+
+    if segundos is None:
+        somas = (df["minuto"] * df["total"]).groupby(df["chave"]).sum() * 60
+    else:
+        # Chaves com soma zero não ficam no resumo
+        somas = pd.Series(segundos, dtype="float64").reindex(grupos["total"].sum().index, fill_value=0)
+    resultado = pd.DataFrame({
+        "registros": grupos["total"].sum(),
+        "media": somas / grupos["total"].sum(),
+        "mediana": percentil(0.5),
+        "p90": percentil(0.9),
+    })
+    return resultado[colunas]
+
+
+# Chave de duplicidade na importação: placa + "Entrada na Fábrica".
+# Sem "Entrada na Fábrica" não há como identificar o registro (chave vazia).
+def chaves_duplicidade(df):
+    placas = df["Placa do caminhão"].astype(object).where(~_mascara_vazios(df["Placa do caminhão"]), "")
+    entradas = horarios_em_texto(df["Entrada na Fábrica"])
+    entradas = entradas.astype(object).where(~_mascara_vazios(entradas), "")
+    chaves = placas.astype(str).str.strip().str.upper() + "|" + entradas.astype(str).str.strip()
+    return chaves.where((placas != "") & (entradas != ""), "")
+
+
+# Registros importados que ainda não existem (nem se repetem dentro da própria importação),
+# prontos para gravar: ID novo, versão 1 e campos_calculados refeitos de uma vez
+def _novos_para_importar(df, chaves_existentes):
+    df = _completar_colunas(df.copy())
+    chaves = chaves_duplicidade(df)
+    repetidos = (chaves != "") & (chaves.isin(chaves_existentes) | chaves.duplicated())
+    novos = df[~repetidos].reset_index(drop=True)
+    for nome, coluna in calcular_tempos(novos).items():
+        novos[nome] = coluna
+    novos[COLUNA_ID] = [novo_id() for _ in range(len(novos))]
+    novos[COLUNA_VERSAO] = 1
+    return novos[colunas_armazenadas], int(repetidos.sum())
+
+
+# Frame pronto para gravar: ID volta a ser coluna, o status derivado sai e
+# horários e categorias voltam a ser texto
+def _para_gravar(df):
+    if df.index.name == COLUNA_ID:
+        df = df.reset_index()
+    return _completar_colunas(registros_em_texto(df.drop(columns=[COLUNA_STATUS], errors="ignore")))
+
+
+# Cópia de um DataFrame tipado com as linhas de `novas` (mesmo índice) no lugar.
+# Valores novos de colunas categóricas entram antes como categorias; colunas
+# só de texto (como "Versão" lida da planilha) recebem os valores como texto.
+def _substituir_linhas(df, novas):
+    df = df.copy()
+    for coluna in novas.columns:
+        if isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            faltantes = pd.Index(novas[coluna].dropna().unique()).difference(df[coluna].cat.categories)
+            if len(faltantes):
+                df[coluna] = df[coluna].cat.add_categories(faltantes)
+            df.loc[novas.index, coluna] = novas[coluna].to_numpy(dtype=object)
+        elif isinstance(df[coluna].dtype, pd.StringDtype):
+            df.loc[novas.index, coluna] = novas[coluna].astype(df[coluna].dtype).to_numpy()
+        else:
+            df.loc[novas.index, coluna] = novas[coluna].to_numpy()
+    return df
+
+
+# DataFrame tipado com as linhas de `novas` (IDs que ainda não estão nele) no fim.
+# As colunas categóricas passam a ter as categorias dos dois lados, para continuarem categóricas.
+def _juntar_linhas(df, novas):
+    df = df.copy()
+    novas = novas.reindex(columns=df.columns)
+    for coluna in df.columns:
+        if isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            valores = novas[coluna].astype(object)
+            categorias = df[coluna].cat.categories.union(pd.Index(valores.dropna().unique()))
+            df[coluna] = df[coluna].cat.set_categories(categorias)
+            novas[coluna] = pd.Categorical(valores, categories=categorias)
+    # O concat infere o tipo do índice de novo; mantém o do DataFrame original
+    juntos = pd.concat([df, novas])
+    juntos.index = juntos.index.astype(df.index.dtype)
+    return juntos
+
+
+# Registros em aberto (DataFrame tipado e indexado pelo ID) com as alterações de
+# alteracoes_desde aplicadas: só as linhas tocadas são refeitas, registros novos
+# entram no fim e os que ganharam "Saída CD" saem. Devolve também os IDs tocados.
+# Alterações de registros que não estão na visão (já finalizados) são ignoradas.
+def aplicar_alteracoes(abertos, alteracoes):
+    campos, inseridos = {}, set()
+    for alteracao in alteracoes:
+        chave = alteracao[COLUNA_ID]
+        campos.setdefault(chave, {}).update(alteracao["campos"])
+        if alteracao["versao"] == 1:
+            inseridos.add(chave)
+    chaves = [chave for chave in campos if chave in abertos.index or chave in inseridos]
+    if not chaves:
+        return abertos, set()
+
+    atuais = registros_em_texto(abertos.reindex(chaves).drop(columns=[COLUNA_STATUS]))
+    linhas = [{**atuais.loc[chave].to_dict(), **campos[chave]} for chave in chaves]
+    novas = _completar_colunas(pd.DataFrame(linhas, index=pd.Index(chaves, name=COLUNA_ID)))
+    novas = preparar_registros(novas.drop(columns=[COLUNA_ID]))
+
+    # Busca pelo índice (hash) de cada ID tocado, sem percorrer a visão inteira
+    abertas = mascara_abertos(novas).to_numpy()
+    presentes = np.array([chave in abertos.index for chave in novas.index], dtype=bool)
+    df = abertos.drop(novas.index[~abertas & presentes])
+    novas, presentes = novas[abertas], presentes[abertas]
+    if presentes.any():
+        df = _substituir_linhas(df, novas[presentes])
+    if not presentes.all():
+        df = _juntar_linhas(df, novas[~presentes])
+    return df, set(chaves)
+
+
+# Entradas de um arquivo JSONL lidas do fim para o começo, em blocos: quem só
+# quer as últimas linhas não lê o arquivo inteiro
+def _entradas_do_fim(caminho, tamanho_bloco=65536):
+    if not os.path.exists(caminho):
+        return
+    with open(caminho, "rb") as f:
+        posicao = f.seek(0, os.SEEK_END)
+        resto = b""
+        while posicao > 0:
+            tamanho = min(tamanho_bloco, posicao)
+            posicao -= tamanho
+            f.seek(posicao)
+            linhas = (f.read(tamanho) + resto).split(b"\n")
+            # A primeira linha do bloco pode ter começado no bloco anterior
+            resto = linhas.pop(0) if posicao > 0 else b""
+            for linha in reversed(linhas):
+                try:
+                    yield json.loads(linha)
+                except ValueError:
+                    # Linha vazia ou incompleta de uma gravação interrompida
+                    continue
+
+
+# Alterações (em ordem) com seq depois de `desde`, a partir das entradas do fim para
+# o começo; None se as alterações seguintes a `desde` já foram descartadas
+def _alteracoes_depois(entradas_do_fim, desde):
+    alteracoes = []
+    for alteracao in entradas_do_fim:
+        if alteracao["seq"] <= desde:
+            break
+        alteracoes.append(alteracao)
+    alteracoes.reverse()
+    if alteracoes and alteracoes[0]["seq"] != desde + 1:
+        return None
+    return alteracoes
+
+
+# Colunas de que resumo_de e rollups_de precisam
+colunas_resumo = ["Data", "Placa do caminhão", "Nome do conferente"] + campos_tempo
+
+
+# Lê de uma planilha só as colunas pedidas, percorrendo as linhas com o openpyxl
+# em modo read_only (values_only): as demais colunas não viram objetos do pandas.
+# `filtro`, se dado, recebe cada linha como dict coluna -> valor e decide se ela
+# entra. Colunas que não existem na planilha vêm vazias; os valores ficam como
+# no arquivo (texto, em geral), como no read_excel com dtype=object.
+def ler_colunas(caminho, sheet_name, colunas, filtro=None):
+    metricas.contar(bytes_lidos=os.path.getsize(caminho))
+    livro = load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        linhas = livro[sheet_name].iter_rows(values_only=True)
+        cabecalho = next(linhas, ())
+        posicoes = {}
+        for posicao, nome in enumerate(cabecalho):
+            # Cabeçalho repetido: vale a primeira coluna, como no read_excel
+            if nome in colunas and nome not in posicoes:
+                posicoes[nome] = posicao
+        indices = [posicoes.get(coluna) for coluna in colunas]
+
+        dados = []
+        for linha in linhas:
+            if all(valor is None for valor in linha):
+                continue
+            valores = tuple(linha[i] if i is not None and i < len(linha) else None for i in indices)
+            if filtro is not None and not filtro(dict(zip(colunas, valores))):
+                continue
+            dados.append(valores)
+    finally:
+        livro.close()
+    metricas.contar(linhas=len(dados))
+    return pd.DataFrame(dados, columns=colunas, dtype=object)
+
+
+# Planilha xlsx + journal de novos registros (uma linha JSON por registro)
+class ArmazenamentoExcel:
+    def __init__(self, excel_path=EXCEL_PATH, sheet_name=SHEET_NAME, journal_path=JOURNAL_PATH, arquivo_dir=ARQUIVO_DIR):
+        self.excel_path = excel_path
+        self.sheet_name = sheet_name
+        self.journal_path = journal_path
+        self.arquivo_dir = arquivo_dir
+        self.particoes_path = os.path.join(arquivo_dir, "particoes.json")
+        self.alteracoes_path = f"{os.path.splitext(excel_path)[0]}.alteracoes.jsonl"
+        self.contagens_path = f"{os.path.splitext(excel_path)[0]}.contagens.db"
+
+    def existe(self):
+        return os.path.exists(self.excel_path) or os.path.exists(self.journal_path)
+
+    # Todas as escritas (journal, planilha e arquivo) passam por esta trava
+    def _trava(self):
+        return TravaArquivo(self.excel_path + ".lock")
+
+    def _caminho_particao(self, mes):
+        nome = os.path.splitext(os.path.basename(self.excel_path))[0]
+        return os.path.join(self.arquivo_dir, f"{nome} {mes}.xlsx")
+
+    # Contagem de registros por partição mensal do arquivo
+    def particoes(self):
+        if not os.path.exists(self.particoes_path):
+            return {}
+        with open(self.particoes_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _carregar_particao(self, mes):
+        caminho = self._caminho_particao(mes)
+        return cache.obter(("excel", self.excel_path, "particao", caminho), _assinatura_arquivos(caminho), lambda: self._ler_particao(caminho))
+
+    def _ler_particao(self, caminho):
+        return preparar_registros(self._ler_particao_texto(caminho).set_index(COLUNA_ID))
+
+    # Partição como está gravada (texto), para exportar sem passar pelos tipos
+    def _ler_particao_texto(self, caminho):
+        metricas.contar(bytes_lidos=os.path.getsize(caminho))
+        df = pd.read_excel(caminho, sheet_name=self.sheet_name, engine="openpyxl", dtype=object)
+        # Partições são só leitura; registros sem ID recebem um para indexação
+        return _completar_tempos(_preencher_ids(_completar_colunas(df)))
+
+    # Lê as operações pendentes no journal (ainda não compactadas na planilha):
+    # registros novos, ou {"operacao": "atualizar", ...} para alterações
+    def ler_journal(self):
+        registros = []
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding="utf-8") as f:
+                for linha in f:
+                    linha = linha.strip()
+                    if not linha:
+                        continue
+                    try:
+                        registros.append(json.loads(linha))
+                    except json.JSONDecodeError:
+                        # Linha incompleta de uma gravação interrompida
+                        continue
+        return registros
+
+    def carregar(self):
+        assinatura = _assinatura_arquivos(self.excel_path, self.journal_path)
+        return cache.obter(("excel", self.excel_path), assinatura, self._ler)
+
+    # Carrega a planilha e aplica os registros do journal por cima. Linhas antigas sem
+    # as durações em segundos saem com os campos_calculados refeitos (ver _completar_tempos),
+    # e assim chegam à compactação, à exportação e à migração para o SQLite.
+    def _ler_arquivos(self):
+        if os.path.exists(self.excel_path):
+            metricas.contar(bytes_lidos=os.path.getsize(self.excel_path))
+            df = pd.read_excel(self.excel_path, sheet_name=self.sheet_name, engine="openpyxl", dtype=object)
+        else:
+            df = pd.DataFrame(columns=colunas_armazenadas, dtype=object)
+        if os.path.exists(self.journal_path):
+            metricas.contar(bytes_lidos=os.path.getsize(self.journal_path))
+
+        pendentes = self.ler_journal()
+        novos = [item for item in pendentes if "operacao" not in item]
+        if novos:
+            df = pd.concat([_completar_colunas(df), pd.DataFrame(novos, dtype=object)], ignore_index=True)
+        df = _completar_colunas(df)
+
+        alteracoes = [item for item in pendentes if item.get("operacao") == "atualizar"]
+        if alteracoes:
+            posicoes = pd.Index(df[COLUNA_ID])
+            for item in alteracoes:
+                if item[COLUNA_ID] not in posicoes:
+                    continue
+                posicao = posicoes.get_loc(item[COLUNA_ID])
+                for coluna, valor in item["valores"].items():
+                    if coluna not in df.columns:
+                        df[coluna] = ""
+                    df.iloc[posicao, df.columns.get_loc(coluna)] = valor
+        return _completar_tempos(df)
+
+    # O DataFrame carregado é indexado pelo ID: a busca por registro é uma consulta de hash
+    def _ler(self):
+        df = self._ler_arquivos()
+        if _mascara_vazios(df[COLUNA_ID]).any():
+            # Primeira carga de uma planilha sem IDs: gera e grava os IDs uma única vez
+            with self._trava():
+                df = _preencher_ids(self._ler_arquivos())
+                self.salvar_planilha(df)
+        return preparar_registros(df.set_index(COLUNA_ID))
+
+    def obter(self, chave):
+        return self.carregar().loc[chave]
+
+    @metricas.cronometrar("filter")
+    def registros_abertos(self):
+        df = self.carregar()
+        return df[mascara_abertos(df)]
+
+    @metricas.cronometrar("filter")
+    def registros_finalizados(self):
+        df = self.carregar()
+        return df[~mascara_abertos(df)]
+
+    def contagens(self):
+        return contagens_do_resumo(self.resumo())
+
+    def resumo(self):
+        return self._resumo("resumo")
+
+    # Histograma de uma duração de campos_analise num agrupamento, ou com
+    # segundos=True a soma dos segundos de cada chave (ver rollups_de)
+    def rollups(self, agrupamento, campo, segundos=False):
+        return self._resumo("rollups", _dimensao_rollup(agrupamento, campo, segundos))
+
+    # Os resumos ficam num SQLite pequeno ao lado da planilha, nas mesmas tabelas do
+    # ArmazenamentoSQLite: cada escrita soma só a sua variação. Cada resumo guarda
+    # a assinatura da planilha e do journal da última escrita que o acompanhou;
+    # se os arquivos mudaram por fora do app, ele é refeito.
+    def _conectar_contagens(self):
+        conn = sqlite3.connect(self.contagens_path, timeout=30)
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT)")
+            for nome in _resumos:
+                _criar_tabela_contagens(conn, nome)
+        return conn
+
+    def _resumo(self, nome, dimensao=None):
+        assinatura = _assinatura_arquivos(self.excel_path, self.journal_path)
+        return cache.obter(("excel", self.excel_path, "resumo", nome, dimensao), assinatura, lambda: self._ler_resumo(nome, dimensao))
+
+    def _ler_resumo(self, nome, dimensao=None):
+        with closing(self._conectar_contagens()) as conn:
+            if not self._resumo_em_dia(conn, nome):
+                with self._trava():
+                    self._preparar_resumos(conn, [nome])
+            return _ler_contagens(conn, nome, dimensao)
+
+    def _assinatura_texto(self):
+        return json.dumps(_assinatura_arquivos(self.excel_path, self.journal_path))
+
+    def _resumo_em_dia(self, conn, nome):
+        gravado = dict(conn.execute("SELECT chave, valor FROM meta WHERE chave IN (?, ?)", (f"{nome}_assinatura", f"{nome}_pronto")))
+        return (gravado.get(f"{nome}_assinatura") == self._assinatura_texto()
+                and gravado.get(f"{nome}_pronto") == str(_versoes_resumos[nome]))
+
+    # Refaz os resumos que não estão em dia com os arquivos (chamar com a trava)
+    def _preparar_resumos(self, conn, nomes=_resumos):
+        for nome in nomes:
+            if self._resumo_em_dia(conn, nome):
+                continue
+            contar = _resumos[nome]
+            resumo = contar(self.carregar())
+            # As partições do arquivo são lidas só com as colunas dos resumos, fora do cache
+            for mes in self.particoes():
+                _somar_resumo(resumo, contar(ler_colunas(self._caminho_particao(mes), self.sheet_name, colunas_resumo)))
+            with conn:
+                conn.execute(f"DELETE FROM {nome}")
+                _somar_contagens(conn, nome, resumo)
+                self._marcar_resumos(conn, [nome])
+
+    def _marcar_resumos(self, conn, nomes):
+        assinatura = self._assinatura_texto()
+        for nome in nomes:
+            conn.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES (?, ?)", (f"{nome}_assinatura", assinatura))
+            conn.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES (?, ?)", (f"{nome}_pronto", str(_versoes_resumos[nome])))
+
+    # Escritas: os resumos são postos em dia antes de mexer nos arquivos e, depois,
+    # recebem as parcelas numa transação só, junto com a assinatura nova (chamar com a trava)
+    def _somar_resumos(self, parcelas):
+        with closing(self._conectar_contagens()) as conn, conn:
+            for nome, parcela in parcelas.items():
+                _somar_contagens(conn, nome, parcela)
+            self._marcar_resumos(conn, parcelas)
+
+    # Registro de alterações: uma linha JSON por gravação, com seq crescente.
+    # Código vazio indica uma gravação em lote (importação), que pede releitura.
+    def _anotar_alteracao(self, chave, campos, versao):
+        alteracao = {"seq": self.ultima_alteracao() + 1, COLUNA_ID: chave, "campos": campos, "versao": versao}
+        with open(self.alteracoes_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(alteracao, ensure_ascii=False, default=str) + "\n")
+
+    def ultima_alteracao(self):
+        return next(_entradas_do_fim(self.alteracoes_path), {"seq": 0})["seq"]
+
+    # Alterações gravadas depois de `desde`, lidas do fim do arquivo: o custo
+    # acompanha a quantidade de alterações, não o tamanho do registro
+    def alteracoes_desde(self, desde):
+        return _alteracoes_depois(_entradas_do_fim(self.alteracoes_path), desde)
+
+    # Mantém só as últimas ALTERACOES_MANTIDAS alterações (chamar com a trava)
+    def _aparar_alteracoes(self):
+        entradas = list(itertools.islice(_entradas_do_fim(self.alteracoes_path), ALTERACOES_MANTIDAS + 1))
+        if len(entradas) <= ALTERACOES_MANTIDAS:
+            return
+        with open(self.alteracoes_path + ".tmp", "w", encoding="utf-8") as f:
+            for alteracao in reversed(entradas[:ALTERACOES_MANTIDAS]):
+                f.write(json.dumps(alteracao, ensure_ascii=False, default=str) + "\n")
+        os.replace(self.alteracoes_path + ".tmp", self.alteracoes_path)
+
+    # Uma página de registros filtrados e o total de registros que atendem aos filtros
+    @metricas.cronometrar("filter")
+    def consultar(self, situacao=None, data_inicio=None, data_fim=None, placa="",
+                  limite=None, deslocamento=0, recentes_primeiro=False):
+        df = self.carregar()
+        if situacao != "abertos":
+            # Registros finalizados antigos ficam nas partições do arquivo
+            meses = _particoes_no_periodo(self.particoes(), data_inicio, data_fim)
+            if meses:
+                df = pd.concat([self._carregar_particao(mes) for mes in meses] + [df])
+        if situacao == "abertos":
+            df = df[mascara_abertos(df)]
+        elif situacao == "finalizados":
+            df = df[~mascara_abertos(df)]
+
+        filtrados = filtrar_registros(df, data_inicio, data_fim, placa)
+        if recentes_primeiro:
+            filtrados = filtrados.iloc[::-1]
+        fim = None if limite is None else deslocamento + limite
+        return filtrados.iloc[deslocamento:fim], len(filtrados)
+
+    # Grava um novo registro anexando uma linha ao journal, sem reler a planilha
+    @metricas.cronometrar("write")
+    def inserir(self, registro):
+        registro = {**registro, COLUNA_ID: registro.get(COLUNA_ID) or novo_id(), COLUNA_VERSAO: 1}
+        parcelas = {nome: contar(pd.DataFrame([registro])) for nome, contar in _resumos.items()}
+        with self._trava():
+            with closing(self._conectar_contagens()) as conn:
+                self._preparar_resumos(conn)
+            df = cache.em_cache(("excel", self.excel_path), _assinatura_arquivos(self.excel_path, self.journal_path))
+            linha = json.dumps(registro, ensure_ascii=False, default=str) + "\n"
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(linha)
+                f.flush()
+                os.fsync(f.fileno())
+            metricas.contar(linhas=1, bytes_gravados=len(linha.encode("utf-8")))
+            self._somar_resumos(parcelas)
+            self._anotar_alteracao(registro[COLUNA_ID], registro, 1)
+
+            # O cache recebe a cópia com a linha nova no fim, preparada como _ler_arquivos
+            # prepara as linhas do journal. Sem o DataFrame em cache (ou com uma coluna
+            # que ele não tem), a próxima leitura relê tudo.
+            novo = _completar_tempos(_completar_colunas(pd.DataFrame([json.loads(linha)], dtype=object))).set_index(COLUNA_ID)
+            if df is None or not novo.columns.isin(df.columns).all():
+                cache.invalidar(("excel", self.excel_path))
+            else:
+                atualizado = _juntar_linhas(df, preparar_registros(novo))
+                cache.substituir(("excel", self.excel_path), _assinatura_arquivos(self.excel_path, self.journal_path), atualizado)
+
+            if len(self.ler_journal()) >= COMPACTAR_A_CADA:
+                self._compactar()
+        return registro[COLUNA_ID]
+
+    # Com versao_esperada, rejeita a alteração se o registro mudou desde que foi lido;
+    # a versão avança uma vez por edição juntada pela fila de escrita (`alteracoes`).
+    # A alteração vai para o journal (só a linha tocada, com os tempos refeitos);
+    # a planilha é reescrita apenas na compactação.
+    @metricas.cronometrar("write")
+    def atualizar(self, chave, valores, versao_esperada=None, alteracoes=1):
+        with self._trava():
+            df = self.carregar()
+            if chave not in df.index:
+                raise RegistroDesatualizado(f"Registro {chave} foi removido por outra sessão")
+            registro = df.loc[chave]
+            versao = _versao(registro[COLUNA_VERSAO])
+            if versao_esperada is not None and versao != versao_esperada:
+                raise RegistroDesatualizado(f"Registro {chave} está na versão {versao}, esperada {versao_esperada}")
+            valores = {**_com_tempos(registro.drop(COLUNA_STATUS), valores), COLUNA_VERSAO: versao + alteracoes}
+            with closing(self._conectar_contagens()) as conn:
+                self._preparar_resumos(conn)
+
+            operacao = {"operacao": "atualizar", COLUNA_ID: chave, "valores": valores}
+            linha = json.dumps(operacao, ensure_ascii=False, default=str) + "\n"
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(linha)
+                f.flush()
+                os.fsync(f.fileno())
+            metricas.contar(linhas=1, bytes_gravados=len(linha.encode("utf-8")))
+
+            # O cache recebe a cópia com a linha alterada, sem reler a planilha
+            linha = pd.DataFrame([{**registro.drop(COLUNA_STATUS).to_dict(), **valores}], index=pd.Index([chave], name=COLUNA_ID))
+            atualizado = _substituir_linhas(df, preparar_registros(linha))
+            self._somar_resumos({nome: _variacao_resumo(registro, atualizado.loc[chave], contar) for nome, contar in _resumos.items()})
+            cache.substituir(("excel", self.excel_path), _assinatura_arquivos(self.excel_path, self.journal_path), atualizado)
+            self._anotar_alteracao(chave, valores, versao + alteracoes)
+
+            if len(self.ler_journal()) >= COMPACTAR_A_CADA:
+                self._compactar()
+
+    # Importação em lote: uma única regravação da planilha com os registros novos.
+    # Compactação, arquivamento, importação e exportação trabalham sobre o texto
+    # lido dos arquivos (_ler_arquivos), nunca sobre o DataFrame tipado do cache:
+    # horários fora do FORMATO_HORARIO e textos que não são horários ficam como estão.
+    @metricas.cronometrar("write")
+    def importar(self, df):
+        with self._trava():
+            atuais = self._ler_arquivos()
+            existentes = set(chaves_duplicidade(atuais))
+            # Das partições só interessam a placa e a entrada das linhas que têm entrada
+            for mes in self.particoes():
+                chaves = ler_colunas(self._caminho_particao(mes), self.sheet_name, ["Placa do caminhão", "Entrada na Fábrica"],
+                                     filtro=lambda linha: linha["Entrada na Fábrica"] not in (None, ""))
+                existentes |= set(chaves_duplicidade(chaves))
+            novos, duplicados = _novos_para_importar(df, existentes)
+            if len(novos):
+                with closing(self._conectar_contagens()) as conn:
+                    self._preparar_resumos(conn)
+                self.salvar_planilha(pd.concat([atuais, novos], ignore_index=True))
+                self._somar_resumos({nome: contar(novos) for nome, contar in _resumos.items()})
+                self._anotar_alteracao(None, {}, None)
+        return {"importados": len(novos), "duplicados": duplicados}
+
+    # Reescreve a planilha inteira (arquivo temporário + troca atômica) e zera o journal
+    @metricas.cronometrar("write")
+    def salvar_planilha(self, df):
+        # Os resumos só continuam válidos se já estavam em dia com os arquivos antes da gravação
+        with closing(self._conectar_contagens()) as conn:
+            em_dia = [nome for nome in _resumos if self._resumo_em_dia(conn, nome)]
+        df = _para_gravar(df)
+        df = df[colunas_armazenadas + [c for c in df.columns if c not in colunas_armazenadas]]
+
+        temporario = self.excel_path + ".tmp.xlsx"
+        with pd.ExcelWriter(temporario, engine="openpyxl", mode="w") as writer:
+            df.to_excel(writer, sheet_name=self.sheet_name, index=False)
+        metricas.contar(linhas=len(df), bytes_gravados=os.path.getsize(temporario))
+        os.replace(temporario, self.excel_path)
+
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        with closing(self._conectar_contagens()) as conn, conn:
+            self._marcar_resumos(conn, em_dia)
+        cache.invalidar(("excel", self.excel_path))
+
+    # Incorpora o journal na planilha que os usuários baixam
+    @metricas.cronometrar("write")
+    def compactar(self):
+        with self._trava():
+            self._compactar()
+
+    def _compactar(self):
+        if os.path.exists(self.journal_path):
+            self.salvar_planilha(self._ler_arquivos())
+
+    # Move os registros finalizados anteriores à janela para planilhas mensais em arquivo_dir
+    @metricas.cronometrar("write")
+    def arquivar(self, hoje=None):
+        with self._trava():
+            self._aparar_alteracoes()
+            return self._arquivar(hoje)
+
+    def _arquivar(self, hoje):
+        df = self._ler_arquivos()
+        datas = df["Data"].astype(str)
+        # Mesmo critério de mascara_abertos: "Saída CD" que não é um horário conta como aberto
+        finalizados = horarios(df["Saída CD"]).notna()
+        antigos = finalizados & (datas < data_corte_arquivo(hoje)) & datas.str.match(r"\d{4}-\d{2}")
+        if not antigos.any():
+            return 0
+
+        os.makedirs(self.arquivo_dir, exist_ok=True)
+        contagens = self.particoes()
+        for mes, grupo in df[antigos].groupby(datas[antigos].str[:7]):
+            caminho = self._caminho_particao(mes)
+            if os.path.exists(caminho):
+                existente = pd.read_excel(caminho, sheet_name=self.sheet_name, engine="openpyxl", dtype=object)
+                grupo = pd.concat([existente, grupo], ignore_index=True)
+            temporario = caminho + ".tmp.xlsx"
+            with pd.ExcelWriter(temporario, engine="openpyxl", mode="w") as writer:
+                grupo.to_excel(writer, sheet_name=self.sheet_name, index=False)
+            os.replace(temporario, caminho)
+            contagens[mes] = len(grupo)
+
+        with open(self.particoes_path, "w", encoding="utf-8") as f:
+            json.dump(contagens, f)
+        self.salvar_planilha(df[~antigos])
+        return int(antigos.sum())
+
+    # Registros do período em lotes de até tamanho_lote linhas, para exportação.
+    # As partições do arquivo são lidas uma por vez e não ficam no cache.
+    def iterar_registros(self, data_inicio=None, data_fim=None, tamanho_lote=LOTE_EXPORTACAO):
+        meses = _particoes_no_periodo(self.particoes(), data_inicio, data_fim)
+        fontes = [lambda mes=mes: self._ler_particao_texto(self._caminho_particao(mes)) for mes in meses] + [self._ler_arquivos]
+        for carregar in fontes:
+            df = carregar()
+            df = _para_gravar(df[_mascara_periodo(df, data_inicio, data_fim)])[colunas_armazenadas]
+            for inicio in range(0, len(df), tamanho_lote):
+                yield df.iloc[inicio:inicio + tamanho_lote]
+
+
+# meta.versao entra na assinatura das leituras em cache do SQLite; é avançada
+# uma vez por transação de escrita, dentro dela
+def _avancar_versao(conn):
+    conn.execute("UPDATE meta SET valor = valor + 1 WHERE chave = 'versao'")
+
+
+# Banco SQLite embutido; a planilha xlsx passa a ser só formato de exportação
+class ArmazenamentoSQLite:
+    colunas_indexadas = ["Placa do caminhão", "Data", "Saída CD"]
+
+    def __init__(self, db_path=DB_PATH, excel_path=EXCEL_PATH, sheet_name=SHEET_NAME, journal_path=JOURNAL_PATH):
+        self.db_path = db_path
+        self.excel_path = excel_path
+        self.sheet_name = sheet_name
+        self.journal_path = journal_path
+        self._preparado = False
+
+    def _conectar(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._preparado:
+            self._criar_tabelas(conn)
+            self._preparado = True
+        return conn
+
+    def _criar_tabelas(self, conn):
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS registros (id INTEGER PRIMARY KEY AUTOINCREMENT, {_definicao_colunas()})")
+            # Bancos criados por versões anteriores ganham as colunas novas
+            tabelas = [nome for (nome,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND (name = 'registros' OR name LIKE 'arquivo_%')"
+            )]
+            completadas = 0
+            for tabela in tabelas:
+                existentes = {linha[1] for linha in conn.execute(f"PRAGMA table_info({tabela})")}
+                for col in colunas_armazenadas:
+                    if col not in existentes:
+                        conn.execute(f'ALTER TABLE {tabela} ADD COLUMN "{col}" {_tipo_coluna(col)}')
+                completadas += conn.execute(f'UPDATE {tabela} SET "{COLUNA_ID}" = lower(hex(randomblob(16))) WHERE "{COLUNA_ID}" IS NULL').rowcount
+                if existentes and not set(campos_segundos.values()) <= existentes:
+                    self._preencher_segundos(conn, tabela)
+                    completadas += 1
+            conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS idx_registros_id ON registros ("{COLUNA_ID}")')
+            for i, col in enumerate(self.colunas_indexadas):
+                conn.execute(f'CREATE INDEX IF NOT EXISTS idx_registros_{i} ON registros ("{col}")')
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT)")
+            # Versão dos dados, avançada uma vez por transação de escrita (inclusive de outros
+            # processos; ver _avancar_versao). Bancos antigos tinham gatilhos por linha para isso.
+            conn.execute("INSERT OR IGNORE INTO meta (chave, valor) VALUES ('versao', 0)")
+            if completadas:
+                _avancar_versao(conn)
+            for operacao in ("insert", "update", "delete"):
+                conn.execute(f"DROP TRIGGER IF EXISTS trg_versao_{operacao}")
+            # Registro de alterações (ver alteracoes_desde), gravado na mesma transação de cada escrita
+            conn.execute("CREATE TABLE IF NOT EXISTS alteracoes (seq INTEGER PRIMARY KEY AUTOINCREMENT, codigo TEXT, campos TEXT NOT NULL, versao INTEGER)")
+            # Quantidade de registros em cada partição mensal do arquivo (tabelas arquivo_AAAA_MM)
+            conn.execute("CREATE TABLE IF NOT EXISTS particoes (mes TEXT PRIMARY KEY, total INTEGER NOT NULL)")
+            migrado = conn.execute("SELECT valor FROM meta WHERE chave = 'migrado_xlsx'").fetchone()
+            if not migrado:
+                self._migrar_planilha(conn)
+                conn.execute("INSERT INTO meta (chave, valor) VALUES ('migrado_xlsx', '1')")
+                _avancar_versao(conn)
+            # Contagens mantidas a cada escrita (ver resumo_de e rollups_de); montadas uma vez a partir dos dados
+            for nome in _resumos:
+                _criar_tabela_contagens(conn, nome)
+                pronto = conn.execute("SELECT valor FROM meta WHERE chave = ?", (f"{nome}_pronto",)).fetchone()
+                if pronto is None or pronto[0] != str(_versoes_resumos[nome]):
+                    self._reconstruir_resumo(conn, nome)
+                    conn.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES (?, ?)", (f"{nome}_pronto", str(_versoes_resumos[nome])))
+                    _avancar_versao(conn)
+
+    # Na primeira execução, importa a planilha (e o journal) existentes para o banco
+    def _migrar_planilha(self, conn):
+        origem = ArmazenamentoExcel(self.excel_path, self.sheet_name, self.journal_path)
+        if not origem.existe():
+            return
+        df = _preencher_ids(origem._ler_arquivos())
+        df[COLUNA_VERSAO] = 1
+        linhas = [
+            tuple(_valor_sql(valor) for valor in linha)
+            for linha in df[colunas_armazenadas].itertuples(index=False, name=None)
+        ]
+        self._inserir_linhas(conn, linhas)
+
+    # Durações em segundos dos registros gravados antes de existirem as colunas de campos_segundos
+    def _preencher_segundos(self, conn, tabela):
+        nomes = ", ".join(f'"{col}"' for col in campos_tempo)
+        df = pd.read_sql_query(f"SELECT id, {nomes} FROM {tabela}", conn, index_col="id").astype(object)
+        segundos = calcular_tempos(df)[list(campos_segundos.values())]
+        atribuicoes = ", ".join(f'"{col}" = ?' for col in segundos.columns)
+        conn.executemany(
+            f"UPDATE {tabela} SET {atribuicoes} WHERE id = ?",
+            [tuple(_valor_sql(valor) for valor in linha) + (id_,) for id_, *linha in segundos.itertuples(name=None)],
+        )
+
+    def _reconstruir_resumo(self, conn, nome):
+        meses = [mes for (mes,) in conn.execute("SELECT mes FROM particoes")]
+        nomes = ", ".join(f'"{col}"' for col in colunas_resumo)
+        df = pd.read_sql_query(f"SELECT {nomes} FROM {self._origem(meses)}", conn).astype(object)
+        conn.execute(f"DELETE FROM {nome}")
+        _somar_contagens(conn, nome, _resumos[nome](df))
+
+    # Importação em lote numa única transação; a checagem de duplicados vê
+    # os registros do banco e os das partições do arquivo
+    @metricas.cronometrar("write")
+    def importar(self, df):
+        with closing(self._conectar()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            meses = [mes for (mes,) in conn.execute("SELECT mes FROM particoes")]
+            atuais = pd.read_sql_query(
+                f'SELECT "Placa do caminhão", "Entrada na Fábrica" FROM {self._origem(meses)}', conn
+            ).astype(object)
+            novos, duplicados = _novos_para_importar(df, set(chaves_duplicidade(atuais)))
+            if len(novos):
+                valores = novos.astype(object)
+                valores = valores.where(~_mascara_vazios_frame(valores), None)
+                self._inserir_linhas(conn, valores.itertuples(index=False, name=None))
+                for nome, contar in _resumos.items():
+                    _somar_contagens(conn, nome, contar(novos))
+                self._anotar_alteracao(conn, None, {}, None)
+        metricas.contar(linhas=len(novos))
+        return {"importados": len(novos), "duplicados": duplicados}
+
+    def _inserir_linhas(self, conn, linhas):
+        nomes = ", ".join(f'"{col}"' for col in colunas_armazenadas)
+        marcadores = ", ".join("?" for _ in colunas_armazenadas)
+        conn.executemany(f"INSERT INTO registros ({nomes}) VALUES ({marcadores})", linhas)
+
+    # Código vazio indica uma gravação em lote (importação), que pede releitura.
+    # Toda escrita anota uma alteração, e com ela a versão dos dados avança.
+    def _anotar_alteracao(self, conn, chave, campos, versao):
+        conn.execute("INSERT INTO alteracoes (codigo, campos, versao) VALUES (?, ?, ?)",
+                     (chave, json.dumps(campos, ensure_ascii=False, default=str), versao))
+        _avancar_versao(conn)
+
+    def ultima_alteracao(self):
+        with closing(self._conectar()) as conn:
+            return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM alteracoes").fetchone()[0]
+
+    # Alterações gravadas depois de `desde`, em ordem, pela chave primária:
+    # o custo acompanha a quantidade de alterações, não a de registros
+    def alteracoes_desde(self, desde):
+        with closing(self._conectar()) as conn:
+            linhas = conn.execute("SELECT seq, codigo, campos, versao FROM alteracoes WHERE seq > ? ORDER BY seq DESC", (desde,))
+            entradas = [
+                {"seq": seq, COLUNA_ID: codigo, "campos": json.loads(campos), "versao": versao}
+                for seq, codigo, campos, versao in linhas
+            ]
+        return _alteracoes_depois(entradas, desde)
+
+    def _assinatura(self):
+        with closing(self._conectar()) as conn:
+            return conn.execute("SELECT valor FROM meta WHERE chave = 'versao'").fetchone()[0]
+
+    # Tabela da consulta: só o conjunto de trabalho ou ele unido às partições pedidas
+    def _origem(self, meses=()):
+        if not meses:
+            return "registros"
+        nomes = ", ".join(["id"] + [f'"{col}"' for col in colunas_armazenadas])
+        partes = [f"SELECT {nomes} FROM registros"] + [f"SELECT {nomes} FROM {_tabela_particao(mes)}" for mes in meses]
+        return "(" + " UNION ALL ".join(partes) + ")"
+
+    # O DataFrame devolvido é indexado pelo ID do registro
+    def _consultar(self, where="", parametros=(), ordem="id", limite=None, deslocamento=0, origem="registros"):
+        nomes = ", ".join(f'"{col}"' for col in colunas_armazenadas)
+        sql = f"SELECT {nomes} FROM {origem} {where} ORDER BY {ordem}"
+        if limite is not None:
+            sql += f" LIMIT {int(limite)} OFFSET {int(deslocamento)}"
+
+        def ler():
+            with closing(self._conectar()) as conn:
+                df = pd.read_sql_query(sql, conn, params=parametros, index_col=COLUNA_ID)
+            return preparar_registros(df.astype(object))
+        return cache.obter(("sqlite", self.db_path, sql, tuple(parametros)), self._assinatura(), ler)
+
+    def _contar(self, where="", parametros=(), origem="registros"):
+        sql = f"SELECT COUNT(*) FROM {origem} {where}"
+
+        def ler():
+            with closing(self._conectar()) as conn:
+                return conn.execute(sql, parametros).fetchone()[0]
+        return cache.obter(("sqlite", self.db_path, sql, tuple(parametros)), self._assinatura(), ler)
+
+    def existe(self):
+        return os.path.exists(self.db_path) or os.path.exists(self.excel_path)
+
+    def carregar(self):
+        return self._consultar()
+
+    @metricas.cronometrar("filter")
+    def registros_abertos(self):
+        return self._consultar('WHERE "Saída CD" IS NULL')
+
+    # Busca de um registro pelo ID, pelo índice único da coluna
+    @metricas.cronometrar("load")
+    def obter(self, chave):
+        nomes = ", ".join(f'"{col}"' for col in colunas_armazenadas)
+        with closing(self._conectar()) as conn:
+            df = pd.read_sql_query(f'SELECT {nomes} FROM registros WHERE "{COLUNA_ID}" = ?', conn,
+                                   params=(chave,), index_col=COLUNA_ID)
+        if df.empty:
+            raise KeyError(chave)
+        return preparar_registros(df.astype(object)).iloc[0]
+
+    @metricas.cronometrar("filter")
+    def registros_finalizados(self):
+        return self._consultar('WHERE "Saída CD" IS NOT NULL')
+
+    # Contagem de registros por partição mensal do arquivo
+    def particoes(self):
+        def ler():
+            with closing(self._conectar()) as conn:
+                return dict(conn.execute("SELECT mes, total FROM particoes").fetchall())
+        return dict(cache.obter(("sqlite", self.db_path, "particoes"), self._assinatura(), ler))
+
+    # Move os registros finalizados anteriores à janela para tabelas mensais (arquivo_AAAA_MM)
+    @metricas.cronometrar("write")
+    def arquivar(self, hoje=None):
+        corte = data_corte_arquivo(hoje)
+        filtro = '"Saída CD" IS NOT NULL AND "Data" < ? AND "Data" GLOB \'[0-9][0-9][0-9][0-9]-[0-9][0-9]*\''
+        nomes = ", ".join(["id"] + [f'"{col}"' for col in colunas_armazenadas])
+        movidos = 0
+        with closing(self._conectar()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            meses = [mes for (mes,) in conn.execute(f'SELECT DISTINCT substr("Data", 1, 7) FROM registros WHERE {filtro}', (corte,))]
+            for mes in meses:
+                tabela = _tabela_particao(mes)
+                condicao = f'{filtro} AND substr("Data", 1, 7) = ?'
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {tabela} (id INTEGER PRIMARY KEY, {_definicao_colunas()})")
+                conn.execute(f"INSERT INTO {tabela} ({nomes}) SELECT {nomes} FROM registros WHERE {condicao}", (corte, mes))
+                total = conn.execute(f"DELETE FROM registros WHERE {condicao}", (corte, mes)).rowcount
+                conn.execute(
+                    "INSERT INTO particoes (mes, total) VALUES (?, ?) "
+                    "ON CONFLICT(mes) DO UPDATE SET total = total + excluded.total",
+                    (mes, total)
+                )
+                movidos += total
+            if movidos:
+                _avancar_versao(conn)
+            conn.execute("DELETE FROM alteracoes WHERE seq <= (SELECT MAX(seq) FROM alteracoes) - ?", (ALTERACOES_MANTIDAS,))
+        return movidos
+
+    # Uma página de registros filtrados e o total de registros que atendem aos filtros.
+    # Os filtros vão no WHERE, então só as linhas da página saem do banco.
+    @metricas.cronometrar("filter")
+    def consultar(self, situacao=None, data_inicio=None, data_fim=None, placa="",
+                  limite=None, deslocamento=0, recentes_primeiro=False):
+        condicoes, parametros = [], []
+        if situacao == "abertos":
+            condicoes.append('"Saída CD" IS NULL')
+        elif situacao == "finalizados":
+            condicoes.append('"Saída CD" IS NOT NULL')
+        if data_inicio:
+            condicoes.append('"Data" >= ?')
+            parametros.append(pd.Timestamp(data_inicio).strftime("%Y-%m-%d"))
+        if data_fim:
+            condicoes.append('"Data" < ?')
+            parametros.append(_dia_seguinte(data_fim))
+        if placa:
+            # Busca literal, como o str.contains(regex=False) do backend Excel: % e _ não são curingas
+            condicoes.append(""""Placa do caminhão" LIKE ? ESCAPE '\\'""")
+            parametros.append("%" + re.sub(r"([\\%_])", r"\\\1", placa) + "%")
+
+        where = "WHERE " + " AND ".join(condicoes) if condicoes else ""
+        ordem = "id DESC" if recentes_primeiro else "id"
+        # Registros finalizados antigos ficam nas partições do arquivo
+        meses = _particoes_no_periodo(self.particoes(), data_inicio, data_fim) if situacao != "abertos" else []
+        origem = self._origem(meses)
+        pagina = self._consultar(where, parametros, ordem, limite, deslocamento, origem)
+        return pagina, self._contar(where, parametros, origem)
+
+    def contagens(self):
+        return contagens_do_resumo(self.resumo())
+
+    # Resumo mantido na tabela resumo; inclui os registros arquivados
+    def resumo(self):
+        def ler():
+            with closing(self._conectar()) as conn:
+                return _ler_contagens(conn, "resumo")
+        return cache.obter(("sqlite", self.db_path, "resumo"), self._assinatura(), ler)
+
+    # Histograma de uma duração de campos_analise num agrupamento, ou com
+    # segundos=True a soma dos segundos de cada chave (ver rollups_de)
+    def rollups(self, agrupamento, campo, segundos=False):
+        dimensao = _dimensao_rollup(agrupamento, campo, segundos)
+
+        def ler():
+            with closing(self._conectar()) as conn:
+                return _ler_contagens(conn, "rollups", dimensao)
+        return cache.obter(("sqlite", self.db_path, "rollups", dimensao), self._assinatura(), ler)
+
+    # As escritas abrem a transação com BEGIN IMMEDIATE: a trava de escrita do
+    # SQLite é tomada logo no início e vale entre processos. As contagens dos
+    # resumos (pandas) são calculadas antes, para a trava durar só os comandos SQL.
+    @metricas.cronometrar("write")
+    def inserir(self, registro):
+        registro = {**registro, COLUNA_ID: registro.get(COLUNA_ID) or novo_id(), COLUNA_VERSAO: 1}
+        linha = tuple(_valor_sql(registro.get(col)) for col in colunas_armazenadas)
+        parcelas = {nome: contar(pd.DataFrame([registro])) for nome, contar in _resumos.items()}
+        with closing(self._conectar()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._inserir_linhas(conn, [linha])
+            for nome, parcela in parcelas.items():
+                _somar_contagens(conn, nome, parcela)
+            self._anotar_alteracao(conn, registro[COLUNA_ID], registro, 1)
+        metricas.contar(linhas=1)
+        return registro[COLUNA_ID]
+
+    # Com versao_esperada, rejeita a alteração se o registro mudou desde que foi lido;
+    # a versão avança uma vez por edição juntada pela fila de escrita (`alteracoes`).
+    # Só a linha do registro é lida e regravada, com os campos_calculados refeitos.
+    @metricas.cronometrar("write")
+    def atualizar(self, chave, valores, versao_esperada=None, alteracoes=1):
+        with closing(self._conectar()) as conn, conn:
+            # Tempos e variações dos resumos saem da linha lida antes da trava;
+            # só são refeitos dentro da transação se a linha mudou nesse meio-tempo
+            lido = self._ler_registro(conn, chave)
+            preparado = lido and _preparar_alteracao(lido, valores, alteracoes)
+
+            conn.execute("BEGIN IMMEDIATE")
+            registro = self._ler_registro(conn, chave)
+            if registro is None:
+                raise RegistroDesatualizado(f"Registro {chave} foi removido por outra sessão")
+            versao = _versao(registro[COLUNA_VERSAO])
+            if versao_esperada is not None and versao != versao_esperada:
+                raise RegistroDesatualizado(f"Registro {chave} está na versão {versao}, esperada {versao_esperada}")
+            if registro != lido:
+                preparado = _preparar_alteracao(registro, valores, alteracoes)
+
+            valores, variacoes = preparado
+            atribuicoes = ", ".join(f'"{col}" = ?' for col in valores)
+            parametros = [_valor_sql(valor) for valor in valores.values()] + [chave]
+            conn.execute(f'UPDATE registros SET {atribuicoes} WHERE "{COLUNA_ID}" = ?', parametros)
+            for nome, variacao in variacoes.items():
+                _somar_contagens(conn, nome, variacao)
+            self._anotar_alteracao(conn, chave, valores, valores[COLUNA_VERSAO])
+        metricas.contar(linhas=1)
+
+    # Linha gravada de um registro (texto, como no banco), ou None
+    def _ler_registro(self, conn, chave):
+        nomes = ", ".join(f'"{col}"' for col in colunas_armazenadas)
+        linhas = conn.execute(f'SELECT {nomes} FROM registros WHERE "{COLUNA_ID}" = ?', (chave,)).fetchall()
+        return dict(zip(colunas_armazenadas, linhas[0])) if linhas else None
+
+    # Registros do período em lotes de até tamanho_lote linhas, para exportação.
+    # O cursor do SQLite entrega um lote por vez; nada passa pelo cache.
+    def iterar_registros(self, data_inicio=None, data_fim=None, tamanho_lote=LOTE_EXPORTACAO):
+        condicoes, parametros = [], []
+        if data_inicio:
+            condicoes.append('"Data" >= ?')
+            parametros.append(pd.Timestamp(data_inicio).strftime("%Y-%m-%d"))
+        if data_fim:
+            condicoes.append('"Data" < ?')
+            parametros.append(_dia_seguinte(data_fim))
+        where = "WHERE " + " AND ".join(condicoes) if condicoes else ""
+        origem = self._origem(_particoes_no_periodo(self.particoes(), data_inicio, data_fim))
+        nomes = ", ".join(f'"{col}"' for col in colunas_armazenadas)
+
+        with closing(self._conectar()) as conn:
+            lotes = pd.read_sql_query(f'SELECT {nomes} FROM {origem} {where} ORDER BY "Data", id',
+                                      conn, params=parametros, chunksize=tamanho_lote)
+            for lote in lotes:
+                yield lote.astype(object)
+
+
+# Campos vazios viram NULL no banco
+def _valor_sql(valor):
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    valor = str(valor)
+    return valor if valor != "" else None
+
+
+def _tipo_coluna(col):
+    if col == COLUNA_VERSAO:
+        return "INTEGER"
+    if col in campos_segundos.values():
+        return "REAL"
+    return "TEXT"
+
+
+def _definicao_colunas():
+    return ", ".join(f'"{col}" {_tipo_coluna(col)}' for col in colunas_armazenadas)
+
+
+def _tabela_particao(mes):
+    return "arquivo_" + mes.replace("-", "_")
+
+
+_armazenamentos = {}
+_ultimos_arquivamentos = {}
+
+
+# Arquiva registros antigos no máximo uma vez a cada INTERVALO_ARQUIVAMENTO segundos
+# por processo, para cada armazenamento (rota)
+def arquivar_se_preciso(armazenamento):
+    agora = time.monotonic()
+    ultimo = _ultimos_arquivamentos.get(armazenamento)
+    if ultimo is not None and agora - ultimo < INTERVALO_ARQUIVAMENTO:
+        return 0
+    _ultimos_arquivamentos[armazenamento] = agora
+    if not armazenamento.existe():
+        return 0
+    return armazenamento.arquivar()
+
+
+# Pasta dos arquivos de uma rota: a primeira de ROTAS fica na pasta do app, com
+# os caminhos de sempre; as demais em ROTAS_DIR, numa pasta com o nome da rota.
+# Os caracteres trocados por "_" podem igualar dois nomes ("A/B" e "A:B"); o
+# hash do nome original no fim mantém uma pasta por rota.
+def pasta_rota(rota=None):
+    if rota is None or rota == ROTAS[0]:
+        return ""
+    nome = re.sub(r"[^\w\- ]", "_", rota).strip()
+    return os.path.join(ROTAS_DIR, f"{nome}-{hashlib.sha1(rota.encode('utf-8')).hexdigest()[:8]}")
+
+
+# Backend configurado em config.ARMAZENAMENTO ("sqlite" ou "excel"), um por rota
+def obter_armazenamento(rota=None):
+    rota = rota or ROTAS[0]
+    if rota not in _armazenamentos:
+        pasta = pasta_rota(rota)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        if ARMAZENAMENTO == "excel":
+            _armazenamentos[rota] = ArmazenamentoExcel(
+                os.path.join(pasta, EXCEL_PATH), SHEET_NAME, os.path.join(pasta, JOURNAL_PATH), os.path.join(pasta, ARQUIVO_DIR)
+            )
+        else:
+            _armazenamentos[rota] = ArmazenamentoSQLite(
+                os.path.join(pasta, DB_PATH), os.path.join(pasta, EXCEL_PATH), SHEET_NAME, os.path.join(pasta, JOURNAL_PATH)
+            )
+    return _armazenamentos[rota]
+
+
+# Visão geral: aplica `ler` ao armazenamento de cada rota em paralelo (cada
+# rota tem os próprios arquivos, então as leituras não disputam trava) e
+# devolve {rota: resultado}, na ordem de ROTAS
+def ler_rotas(ler, rotas=None):
+    rotas = list(rotas or ROTAS)
+    armazenamentos = [obter_armazenamento(rota) for rota in rotas]
+    with ThreadPoolExecutor(max_workers=max(1, min(LEITURAS_PARALELAS, len(rotas))), thread_name_prefix="rotas") as executor:
+        return dict(zip(rotas, executor.map(ler, armazenamentos)))
+
+
+# Registros em aberto de todas as rotas num DataFrame só, com a coluna "Rota"
+@metricas.cronometrar("load")
+def abertos_de_todas_as_rotas(rotas=None):
+    abertos = ler_rotas(lambda banco: banco.registros_abertos() if banco.existe() else None, rotas)
+    partes = [df.assign(Rota=rota) for rota, df in abertos.items() if df is not None and not df.empty]
+    if not partes:
+        return pd.DataFrame(columns=["Rota"])
+    # Cada rota tem as próprias categorias; placa e conferente voltam a ser categóricos depois de juntar
+    return tipar_registros(pd.concat(partes))
@@ -0,0 +1,200 @@
+"""Benchmark dos caminhos de carga, gravação, edição e renderização das páginas.
+
+Gera planilhas "Basae" sintéticas com o esquema real (campos_tempo) nos
+tamanhos pedidos e mede, para cada backend:
+
+- leitura da planilha com read_excel e só de algumas colunas com ler_colunas;
+- calcular_tempo/obter_status linha a linha (o caminho antigo) e
+  calcular_tempos/calcular_status sobre o DataFrame inteiro;
+- preparação do armazenamento (migração da planilha no SQLite) e arquivamento;
+- gravação de um registro novo e de uma edição;
+- leitura inicial do painel "Em Operação" e a atualização que aplica só as alterações;
+- uma execução de cada página do app pelo AppTest do Streamlit.
+
+Os resultados vão para um JSON, para comparar versões.
+
+Uso:
+    python benchmarks/desempenho.py --tamanhos 1000 10000 100000 --saida desempenho.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import armazenamento  # noqa: E402
+import escritas  # noqa: E402
+import painel  # noqa: E402
+from calculos import calcular_status, calcular_tempo, calcular_tempos, obter_status  # noqa: E402
+from config import EXCEL_PATH, SHEET_NAME, campos_tempo, colunas_esperadas, pares_calculados  # noqa: E402
+
+PAGINAS = [
+    "Tela Inicial", "Lançar Novo Controle", "Editar Lançamentos Incompletos",
+    "Em Operação", "Finalizadas", "Análises", "Importar Planilhas", "Visão Geral",
+]
+
+# Minutos típicos entre um campo_tempo e o seguinte (média de uma exponencial)
+INTERVALOS_MINUTOS = [35, 20, 40, 15, 10, 15, 180, 25, 10, 45, 15]
+
+
+# Planilha sintética: registros espalhados pelo último ano, 90% finalizados e o
+# resto parado numa etapa qualquer; campos_calculados preenchidos como o app grava
+def gerar_planilha(tamanho, semente=42):
+    gerador = np.random.default_rng(semente)
+    hoje = pd.Timestamp(datetime.now().date())
+    entradas = hoje - pd.to_timedelta(gerador.integers(0, 365 * 24 * 60, tamanho), unit="m")
+    entradas = entradas.sort_values()
+
+    etapas = np.full(tamanho, len(campos_tempo))
+    abertos = gerador.random(tamanho) < 0.1
+    etapas[abertos] = gerador.integers(1, len(campos_tempo), abertos.sum())
+
+    df = pd.DataFrame({
+        "Data": entradas.strftime("%Y-%m-%d"),
+        "Placa do caminhão": [f"SIM{numero:04d}" for numero in gerador.integers(0, 500, tamanho)],
+        "Nome do conferente": [f"Conferente {numero:02d}" for numero in gerador.integers(0, 20, tamanho)],
+    })
+    instante = pd.Series(entradas)
+    for posicao, campo in enumerate(campos_tempo):
+        if posicao > 0:
+            instante = instante + pd.to_timedelta(gerador.exponential(INTERVALOS_MINUTOS[posicao - 1], tamanho), unit="m")
+        df[campo] = instante.dt.strftime("%Y-%m-%d %H:%M:%S").where(etapas > posicao, "").to_numpy()
+
+    for nome, coluna in calcular_tempos(df).items():
+        df[nome] = coluna
+    return df[[coluna for coluna in colunas_esperadas if coluna in df.columns]]
+
+
+def medir(resultados, tamanho, backend, etapa, funcao, **extra):
+    inicio = time.perf_counter()
+    valor = funcao()
+    segundos = time.perf_counter() - inicio
+    resultados.append({"tamanho": tamanho, "backend": backend, "etapa": etapa, "segundos": round(segundos, 4), **extra})
+    print(f"  {backend:6} {tamanho:>7} {etapa:45} {segundos:9.3f} s")
+    return valor
+
+
+# Caminho antigo, valor a valor, limitado às primeiras `limite` linhas
+def calculos_linha_a_linha(df):
+    for _, registro in df.iterrows():
+        for inicio, fim in pares_calculados.values():
+            calcular_tempo(registro[inicio], registro[fim])
+        obter_status(registro)
+
+
+def medir_tamanho(tamanho, backends, limite_escalar, paginas, resultados):
+    from streamlit.testing.v1 import AppTest
+
+    pasta = tempfile.mkdtemp(prefix="desempenho_")
+    origem = os.path.join(pasta, "origem.xlsx")
+    print(f"gerando planilha com {tamanho} linhas...")
+    planilha = gerar_planilha(tamanho)
+    with pd.ExcelWriter(origem, engine="openpyxl") as writer:
+        planilha.to_excel(writer, sheet_name=SHEET_NAME, index=False)
+
+    df = medir(resultados, tamanho, "-", "read_excel",
+               lambda: pd.read_excel(origem, sheet_name=SHEET_NAME, engine="openpyxl", dtype=object))
+    medir(resultados, tamanho, "-", "ler_colunas (Saída CD, Entrada CD)",
+          lambda: armazenamento.ler_colunas(origem, SHEET_NAME, ["Saída CD", "Entrada CD"]))
+    medir(resultados, tamanho, "-", "ler_colunas (placa dos abertos, com filtro)",
+          lambda: armazenamento.ler_colunas(origem, SHEET_NAME, ["Placa do caminhão", "Saída CD"],
+                                            filtro=lambda linha: linha["Saída CD"] in (None, "")))
+    amostra = df.head(limite_escalar)
+    medir(resultados, tamanho, "-", "calcular_tempo/obter_status (linha a linha)",
+          lambda: calculos_linha_a_linha(amostra), linhas=len(amostra))
+    medir(resultados, tamanho, "-", "calcular_tempos/calcular_status", lambda: (calcular_tempos(df), calcular_status(df)))
+
+    diretorio_original = os.getcwd()
+    try:
+        for backend in backends:
+            trabalho = os.path.join(pasta, backend)
+            os.makedirs(trabalho)
+            shutil.copy(origem, os.path.join(trabalho, EXCEL_PATH))
+            os.chdir(trabalho)
+
+            # Cada backend começa do zero: sem instância, fila de escrita, cache nem arquivamento anteriores
+            armazenamento.ARMAZENAMENTO = backend
+            armazenamento._armazenamentos.clear()
+            escritas._filas.clear()
+            painel._paineis.clear()
+            armazenamento._ultimos_arquivamentos.clear()
+            armazenamento.cache.invalidar()
+
+            banco = armazenamento.obter_armazenamento()
+            medir(resultados, tamanho, backend, "preparar (migração e resumos)", banco.contagens)
+            medir(resultados, tamanho, backend, "arquivar", lambda: armazenamento.arquivar_se_preciso(banco))
+            medir(resultados, tamanho, backend, "carregar (abertos)", banco.registros_abertos)
+            visao = painel.obter_painel(banco)
+            medir(resultados, tamanho, backend, "painel: primeira leitura", visao.atualizar)
+
+            agora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            chave = medir(resultados, tamanho, backend, "salvar novo registro", lambda: banco.inserir({
+                "Data": agora[:10], "Placa do caminhão": "BENCH01", "Nome do conferente": "Benchmark",
+                "Entrada na Fábrica": agora,
+            }))
+            versao = armazenamento.versao_registro(banco.obter(chave))
+            medir(resultados, tamanho, backend, "salvar edição", lambda: banco.atualizar(
+                chave, {"Encostou na doca Fábrica": agora}, versao_esperada=versao,
+            ))
+            medir(resultados, tamanho, backend, "painel: atualização (2 alterações)", visao.atualizar)
+
+            if paginas:
+                app = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=600)
+                for pagina in PAGINAS:
+                    app.session_state["pagina_atual"] = pagina
+                    medir(resultados, tamanho, backend, f"página: {pagina}", app.run)
+                    if app.exception:
+                        raise RuntimeError(f"{pagina}: {app.exception[0].message}")
+    finally:
+        os.chdir(diretorio_original)
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+def versao_do_codigo():
+    try:
+        return subprocess.run(["git", "-C", RAIZ, "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--backends", nargs="+", choices=["sqlite", "excel"], default=["sqlite", "excel"])
+    parser.add_argument("--limite-escalar", type=int, default=10000,
+                        help="linhas medidas no caminho linha a linha (ele é lento demais para 100k)")
+    parser.add_argument("--sem-paginas", action="store_true", help="não roda as páginas pelo AppTest")
+    parser.add_argument("--saida", default="desempenho.json")
+    args = parser.parse_args()
+
+    resultados = []
+    for tamanho in args.tamanhos:
+        medir_tamanho(tamanho, args.backends, args.limite_escalar, not args.sem_paginas, resultados)
+
+    relatorio = {
+        "versao": versao_do_codigo(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "plataforma": platform.platform(),
+        "resultados": resultados,
+    }
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    print(f"resultados gravados em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
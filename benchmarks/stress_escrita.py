@@ -0,0 +1,106 @@
+"""Teste de estresse de escritas concorrentes.
+
+Sobe N processos escritores contra o mesmo armazenamento. Cada um grava
+novos registros e incrementa um contador compartilhado com verificação de
+versão (tentando de novo quando recebe RegistroDesatualizado). No fim,
+confere que nenhum registro e nenhum incremento se perdeu, que o resumo de
+contagens bate com os dados e mostra a vazão.
+
+Uso:
+    python benchmarks/stress_escrita.py --backend sqlite --processos 8 --escritas 50 --incrementos 20
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import armazenamento  # noqa: E402
+
+
+def criar_armazenamento(backend, pasta):
+    excel_path = os.path.join(pasta, "Controle Transferencia.xlsx")
+    journal_path = os.path.join(pasta, "Controle Transferencia.journal.jsonl")
+    if backend == "excel":
+        return armazenamento.ArmazenamentoExcel(excel_path, journal_path=journal_path, arquivo_dir=os.path.join(pasta, "arquivo"))
+    return armazenamento.ArmazenamentoSQLite(os.path.join(pasta, "controle.db"), excel_path, journal_path=journal_path)
+
+
+def escritor(numero, backend, pasta, chave_contador, escritas, incrementos, resultados):
+    banco = criar_armazenamento(backend, pasta)
+    conflitos = 0
+    inicio = time.perf_counter()
+
+    for i in range(escritas):
+        banco.inserir({"Data": "2025-01-01", "Placa do caminhão": f"P{numero:02d}-{i:05d}", "Nome do conferente": "STRESS"})
+
+    for _ in range(incrementos):
+        while True:
+            registro = banco.obter(chave_contador)
+            valor = int(registro["Nome do conferente"])
+            try:
+                banco.atualizar(chave_contador, {"Nome do conferente": str(valor + 1)},
+                                versao_esperada=armazenamento.versao_registro(registro))
+                break
+            except armazenamento.RegistroDesatualizado:
+                conflitos += 1
+
+    resultados.put({"conflitos": conflitos, "segundos": time.perf_counter() - inicio})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["sqlite", "excel"], default="sqlite")
+    parser.add_argument("--processos", type=int, default=8)
+    parser.add_argument("--escritas", type=int, default=50, help="novos registros por processo")
+    parser.add_argument("--incrementos", type=int, default=20, help="atualizações do contador por processo")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        banco = criar_armazenamento(args.backend, pasta)
+        chave_contador = banco.inserir({"Data": "2025-01-01", "Placa do caminhão": "CONTADOR", "Nome do conferente": "0"})
+
+        resultados = multiprocessing.Queue()
+        processos = [
+            multiprocessing.Process(
+                target=escritor,
+                args=(n, args.backend, pasta, chave_contador, args.escritas, args.incrementos, resultados),
+            )
+            for n in range(args.processos)
+        ]
+        inicio = time.perf_counter()
+        for processo in processos:
+            processo.start()
+        estatisticas = [resultados.get() for _ in processos]
+        for processo in processos:
+            processo.join()
+        duracao = time.perf_counter() - inicio
+
+        armazenamento.cache.invalidar()
+        df = banco.carregar()
+        registros = int((df["Nome do conferente"] == "STRESS").sum())
+        contador = int(df.loc[chave_contador, "Nome do conferente"])
+        resumo_em_dia = banco.contagens() == armazenamento.contagens_do_resumo(armazenamento.resumo_de(df))
+
+    esperados = args.processos * args.escritas
+    incrementos = args.processos * args.incrementos
+    escritas = esperados + incrementos
+    print(f"backend:               {args.backend}")
+    print(f"processos:             {args.processos}")
+    print(f"registros gravados:    {registros}/{esperados}")
+    print(f"contador:              {contador}/{incrementos}")
+    print(f"conflitos de versão:   {sum(e['conflitos'] for e in estatisticas)} (refeitos)")
+    print(f"tempo total:           {duracao:.2f} s")
+    print(f"vazão de escrita:      {escritas / duracao:.1f} escritas/s")
+
+    perdidos = (esperados - registros) + (incrementos - contador)
+    print(f"atualizações perdidas: {perdidos}")
+    print(f"resumo em dia:         {'sim' if resumo_em_dia else 'NÃO'}")
+    sys.exit(1 if perdidos or not resumo_em_dia else 0)
+
+
+if __name__ == "__main__":
+    main()
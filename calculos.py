@@ -0,0 +1,219 @@
+import numpy as np
+import pandas as pd
+
+import metricas
+from config import campos_tempo, campos_calculados, campos_segundos, pares_calculados, limites_etapa_minutos
+
+FORMATO_HORARIO = "%Y-%m-%d %H:%M:%S"
+
+# Coluna derivada com a etapa atual de cada registro (não é gravada)
+COLUNA_STATUS = "Status"
+
+# Colunas de texto muito repetido, categóricas no DataFrame em memória
+colunas_categoricas = ["Placa do caminhão", "Nome do conferente"]
+
+
+# Função para calcular diferença de tempo
+def calcular_tempo(inicio, fim):
+    if pd.isna(inicio) or pd.isna(fim) or inicio == "" or fim == "":
+        return ""
+    try:
+        inicio_dt = pd.to_datetime(inicio)
+        fim_dt = pd.to_datetime(fim)
+        diff = fim_dt - inicio_dt
+        horas = int(diff.total_seconds() // 3600)
+        minutos = int((diff.total_seconds() % 3600) // 60)
+        return f"{horas:02d}:{minutos:02d}"
+    except:
+        return ""
+
+
+# Mesma diferença de calcular_tempo, em segundos (NaN quando não há como calcular)
+def calcular_segundos(inicio, fim):
+    if pd.isna(inicio) or pd.isna(fim) or inicio == "" or fim == "":
+        return np.nan
+    try:
+        return (pd.to_datetime(fim) - pd.to_datetime(inicio)).total_seconds()
+    except:
+        return np.nan
+
+
+# Segundos no formato "HH:MM" de calcular_tempo; vazio para NaN.
+# Cada total de minutos distinto é formatado uma vez só.
+def formatar_duracao(segundos):
+    segundos = pd.Series(segundos, dtype="float64")
+    codigos, minutos = pd.factorize(np.floor_divide(segundos, 60))
+    textos = np.array([f"{int(m // 60):02d}:{int(m % 60):02d}" for m in minutos] + [""], dtype=object)
+    return pd.Series(textos[codigos], index=segundos.index, dtype=object)
+
+
+# Função para encontrar o último campo preenchido (status)
+def obter_status(registro):
+    for campo in reversed(campos_tempo):
+        if not pd.isna(registro[campo]) and registro[campo] != "":
+            return campo
+    return "Não iniciado"
+
+
+def _vazios(serie):
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.isna()
+    return pd.isna(serie) | (serie.astype(object) == "")
+
+
+# Converte uma coluna de horários para datetime64 de uma vez.
+# Devolve também a máscara de valores preenchidos que não estão no formato
+# gravado pelo app; esses ficam para calcular_tempo, valor a valor.
+def _para_datetime(serie):
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie, pd.Series(False, index=serie.index)
+    vazios = _vazios(serie)
+    try:
+        convertida = pd.to_datetime(serie.where(~vazios), format=FORMATO_HORARIO, errors="coerce")
+    except (TypeError, ValueError):
+        return pd.Series(pd.NaT, index=serie.index, dtype="datetime64[ns]"), ~vazios
+    return convertida, ~vazios & convertida.isna()
+
+
+# Calcula todos os campos_calculados do DataFrame com aritmética de arrays.
+# O resultado é idêntico ao de calcular_tempo aplicado linha a linha; junto
+# vêm as colunas de campos_segundos, com a mesma diferença em segundos.
+@metricas.cronometrar("compute", linhas=True)
+def calcular_tempos(df):
+    convertidas = {}
+    for campo in {campo for par in pares_calculados.values() for campo in par}:
+        if campo in df.columns:
+            convertidas[campo] = _para_datetime(df[campo])
+        else:
+            convertidas[campo] = (
+                pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]"),
+                pd.Series(False, index=df.index),
+            )
+
+    resultado = pd.DataFrame(index=df.index)
+    for nome, (inicio, fim) in pares_calculados.items():
+        inicio_dt, inicio_fora = convertidas[inicio]
+        fim_dt, fim_fora = convertidas[fim]
+
+        segundos = pd.Series((fim_dt - inicio_dt) / np.timedelta64(1, "s"), index=df.index, dtype="float64")
+        coluna = formatar_duracao(segundos)
+
+        # Valores fora do formato padrão seguem o caminho antigo
+        fora = (inicio_fora | fim_fora).to_numpy()
+        for posicao in np.flatnonzero(fora):
+            coluna.iat[posicao] = calcular_tempo(df[inicio].iat[posicao], df[fim].iat[posicao])
+            segundos.iat[posicao] = calcular_segundos(df[inicio].iat[posicao], df[fim].iat[posicao])
+
+        resultado[nome] = coluna
+        resultado[campos_segundos[nome]] = segundos
+    return resultado
+
+
+# Status de todas as linhas de uma vez: o último campo_tempo preenchido,
+# pela máscara booleana (linhas x campos_tempo) de valores não vazios
+@metricas.cronometrar("compute", linhas=True)
+def calcular_status(df):
+    preenchidos = np.column_stack([
+        ~_vazios(df[campo]).to_numpy() if campo in df.columns else np.zeros(len(df), dtype=bool)
+        for campo in campos_tempo
+    ])
+
+    ultimo = len(campos_tempo) - 1 - np.argmax(preenchidos[:, ::-1], axis=1)
+    nomes = np.array(campos_tempo + ["Não iniciado"], dtype=object)
+    ultimo[~preenchidos.any(axis=1)] = len(campos_tempo)
+    return pd.Series(nomes[ultimo], index=df.index, dtype=object)
+
+
+# Registros parados na etapa atual além do limite de limites_etapa_minutos, numa
+# passada só: o horário do último campo_tempo preenchido (a etapa de calcular_status)
+# de cada linha é comparado com `agora` e com o limite da etapa. Devolve os atrasados,
+# do maior excesso para o menor.
+@metricas.cronometrar("compute", linhas=True)
+def detectar_atrasos(df, agora, limites=limites_etapa_minutos):
+    etapas = df[COLUNA_STATUS] if COLUNA_STATUS in df.columns else calcular_status(df)
+    posicoes = pd.Index(campos_tempo).get_indexer(etapas)
+    iniciados = posicoes >= 0
+
+    tempos = np.column_stack([
+        horarios(df[campo]).to_numpy(dtype="datetime64[s]") if campo in df.columns
+        else np.full(len(df), np.datetime64("NaT"), dtype="datetime64[s]")
+        for campo in campos_tempo
+    ])
+    ultimos = np.full(len(df), np.datetime64("NaT"), dtype="datetime64[s]")
+    ultimos[iniciados] = tempos[np.flatnonzero(iniciados), posicoes[iniciados]]
+
+    # Os horários gravados são do FUSO_HORARIO, sem fuso: `agora` é comparado pela hora local
+    agora = pd.Timestamp(agora)
+    if agora.tzinfo is not None:
+        agora = agora.tz_localize(None)
+    parados = (agora.to_datetime64().astype("datetime64[s]") - ultimos) / np.timedelta64(1, "m")
+    limite = etapas.map(limites).to_numpy(dtype="float64")
+    with np.errstate(invalid="ignore"):
+        atrasados = parados > limite
+
+    proximas = np.array(campos_tempo[1:] + [""], dtype=object)
+    resultado = pd.DataFrame({
+        "Etapa": etapas.to_numpy(dtype=object),
+        "Aguardando": proximas[posicoes],
+        "Desde": ultimos,
+        "Parado (min)": np.floor(parados),
+        "Limite (min)": limite,
+    }, index=df.index)[atrasados]
+    resultado["Excesso (min)"] = resultado["Parado (min)"] - resultado["Limite (min)"]
+    return resultado.sort_values("Excesso (min)", ascending=False)
+
+
+# Coluna de horários em datetime64, com NaT nos vazios. Valores fora do
+# FORMATO_HORARIO são lidos um a um, como em calcular_tempo; o que não for
+# um horário também vira NaT.
+def horarios(serie):
+    convertida, fora = _para_datetime(serie)
+    if fora.any():
+        convertida = convertida.copy()
+        convertida[fora] = pd.to_datetime(serie[fora].astype(str), format="mixed", errors="coerce")
+    return convertida
+
+
+# Volta uma coluna de horários para o texto gravado pelo app (NaN nos vazios)
+def horarios_em_texto(serie):
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.dt.strftime(FORMATO_HORARIO).astype(object)
+    return serie
+
+
+# Tipos do DataFrame em memória: campos_tempo em datetime64 (NaT nos vazios),
+# placa e conferente categóricos e "Data" em texto, com NaN nos vazios.
+# Colunas que já estão no tipo certo passam direto.
+def tipar_registros(df):
+    df = df.copy()
+    for campo in campos_tempo:
+        if campo in df.columns:
+            df[campo] = horarios(df[campo])
+    for coluna in colunas_categoricas:
+        if coluna in df.columns and not isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].where(~_vazios(df[coluna])).astype("category")
+    if "Data" in df.columns and not isinstance(df["Data"].dtype, pd.StringDtype):
+        df["Data"] = df["Data"].where(~_vazios(df["Data"])).astype("str")
+    return df
+
+
+# Caminho inverso de tipar_registros, para gravar ou exportar: horários e
+# categorias voltam a ser texto
+def registros_em_texto(df):
+    df = df.copy()
+    for coluna in df.columns:
+        if coluna in campos_tempo:
+            df[coluna] = horarios_em_texto(df[coluna])
+        elif isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].astype(object)
+    return df
+
+
+# Devolve uma cópia tipada do DataFrame com os campos_calculados e o status preenchidos.
+# Os textos "HH:MM" se repetem muito e ficam categóricos; as durações em segundos são float.
+def preparar_registros(df):
+    df = tipar_registros(df)
+    for nome, coluna in calcular_tempos(df).items():
+        df[nome] = coluna.astype("category") if nome in campos_calculados else coluna
+    df[COLUNA_STATUS] = calcular_status(df)
+    return df
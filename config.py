@@ -0,0 +1,119 @@
+import os
+from datetime import timezone, timedelta
+
+# Configurações
+EXCEL_PATH = "Controle Transferencia.xlsx"
+SHEET_NAME = "Basae"
+FUSO_HORARIO = timezone(timedelta(hours=-3))  # UTC-3
+
+# Backend de armazenamento: "sqlite" (padrão) ou "excel"
+ARMAZENAMENTO = os.environ.get("ARMAZENAMENTO", "sqlite")
+DB_PATH = "controle_transferencia.db"
+
+# Journal de novos registros (uma linha JSON por registro, só anexado)
+JOURNAL_PATH = "Controle Transferencia.journal.jsonl"
+# Quantidade de registros no journal que dispara a compactação na planilha
+COMPACTAR_A_CADA = 200
+
+# Registros finalizados há mais de JANELA_ARQUIVO_DIAS saem do conjunto de trabalho
+# para partições mensais (tabelas no SQLite, planilhas em ARQUIVO_DIR no backend excel)
+JANELA_ARQUIVO_DIAS = 30
+ARQUIVO_DIR = "arquivo"
+INTERVALO_ARQUIVAMENTO = 3600  # segundos
+
+# Segundos que uma escrita espera pela trava antes de desistir
+TEMPO_ESPERA_TRAVA = 30
+
+# Gravações enviadas pelos botões de salvar, anotadas aqui até a fila de escrita
+# aplicá-las no armazenamento (reenviadas quando o app sobe de novo). O journal
+# pertence ao processo do app: todas as sessões do Streamlit usam a mesma fila.
+ESCRITAS_PENDENTES_PATH = "escritas_pendentes.jsonl"
+LOTE_ESCRITAS = 50  # operações aplicadas por vez
+TENTATIVAS_ESCRITA = 3  # uma operação que falha tantas vezes é descartada do journal
+RESULTADOS_MANTIDOS = 1000  # resultados à espera das sessões; os mais antigos são descartados
+
+# Rotas (fábrica → CD) operadas pelo app: ROTAS no ambiente, separadas por vírgula.
+# Cada rota tem os próprios arquivos de dados, trava e fila de escrita; a primeira
+# usa os caminhos acima, na pasta do app, e as demais ficam em ROTAS_DIR/<rota>.
+ROTAS = list(dict.fromkeys(rota.strip() for rota in os.environ.get("ROTAS", "Principal").split(",") if rota.strip()))
+ROTAS_DIR = "rotas"
+# Rotas lidas ao mesmo tempo na visão geral
+LEITURAS_PARALELAS = 4
+
+# Linhas lidas do armazenamento por vez ao exportar
+LOTE_EXPORTACAO = 5000
+
+# Métricas de cada execução do script (tempo por etapa, linhas e bytes), gravadas
+# em METRICAS_PATH e rotacionadas por tamanho; METRICAS=0 no ambiente desliga
+METRICAS_ATIVAS = os.environ.get("METRICAS", "1") != "0"
+METRICAS_PATH = "metricas.jsonl"
+METRICAS_TAMANHO_MAXIMO = 5 * 1024 * 1024  # bytes por arquivo
+METRICAS_ARQUIVOS = 3  # arquivos antigos mantidos (metricas.jsonl.1, .2, ...)
+# Painel de métricas na barra lateral: ADMIN=1 no ambiente ou ?admin=1 na URL
+ADMIN = os.environ.get("ADMIN", "0") == "1"
+
+# Registro de alterações (código do registro, campos e versão de cada gravação),
+# lido pelo painel "Em Operação" para aplicar só o que mudou desde a última leitura
+ALTERACOES_MANTIDAS = 5000  # alterações guardadas; quem ficou mais atrás recarrega tudo
+INTERVALO_PAINEL = 10  # segundos entre as atualizações do painel "Em Operação"
+
+# Paginação das listas "Em Operação" e "Finalizadas"
+TAMANHO_PAGINA = 25
+OPCOES_TAMANHO_PAGINA = [10, 25, 50, 100]
+
+campos_tempo = [
+    "Entrada na Fábrica", "Encostou na doca Fábrica", "Início carregamento",
+    "Fim carregamento", "Faturado", "Amarração carga", "Saída do pátio",
+    "Entrada CD", "Encostou na doca CD", "Início Descarregamento CD",
+    "Fim Descarregamento CD", "Saída CD"
+]
+
+# Campos de cálculo que devem ser salvos
+campos_calculados = [
+    "Tempo Espera Doca", "Tempo Total", "Tempo de Descarregamento CD",
+    "Tempo Espera Doca CD", "Tempo Total CD", "Tempo Percurso Para CD", "Tempo de Carregamento"
+]
+
+# Par de campos (início, fim) de cada campo calculado
+pares_calculados = {
+    "Tempo Espera Doca": ("Entrada na Fábrica", "Encostou na doca Fábrica"),
+    "Tempo Total": ("Entrada na Fábrica", "Saída do pátio"),
+    "Tempo de Descarregamento CD": ("Início Descarregamento CD", "Fim Descarregamento CD"),
+    "Tempo Espera Doca CD": ("Entrada CD", "Encostou na doca CD"),
+    "Tempo Total CD": ("Entrada CD", "Saída CD"),
+    "Tempo Percurso Para CD": ("Saída do pátio", "Entrada CD"),
+    "Tempo de Carregamento": ("Início carregamento", "Fim carregamento"),
+}
+
+# Minutos que um veículo pode ficar em cada etapa (o último campo_tempo preenchido)
+# sem o campo seguinte antes de entrar nos alertas de atraso do painel "Em Operação".
+# "Saída do pátio" cobre o percurso até o CD. Etapas fora da tabela não geram alerta.
+limites_etapa_minutos = {
+    "Entrada na Fábrica": 60,
+    "Encostou na doca Fábrica": 45,
+    "Início carregamento": 90,
+    "Fim carregamento": 30,
+    "Faturado": 30,
+    "Amarração carga": 30,
+    "Saída do pátio": 240,
+    "Entrada CD": 60,
+    "Encostou na doca CD": 45,
+    "Início Descarregamento CD": 90,
+    "Fim Descarregamento CD": 30,
+}
+
+# Cada campo calculado também é gravado em segundos, para as análises não relerem o texto "HH:MM"
+campos_segundos = {campo: f"{campo} (s)" for campo in campos_calculados}
+
+# Ordem esperada das colunas na planilha
+colunas_esperadas = ["Data", "Placa do caminhão", "Nome do conferente"] + campos_tempo + campos_calculados + list(campos_segundos.values())
+
+# Página de análises: durações acompanhadas e agrupamentos disponíveis
+campos_analise = ["Tempo Espera Doca", "Tempo de Carregamento", "Tempo Percurso Para CD", "Tempo Total CD"]
+agrupamentos_analise = {"dia": "Dia", "semana": "Semana", "conferente": "Conferente", "placa": "Placa"}
+
+# Colunas de controle gravadas junto com cada registro (não são editáveis)
+COLUNA_ID = "Código"  # identificador único e permanente, gerado na criação do registro
+COLUNA_VERSAO = "Versão"  # incrementada a cada alteração, para detectar edições concorrentes
+colunas_controle = [COLUNA_ID, COLUNA_VERSAO]
+colunas_armazenadas = colunas_esperadas + colunas_controle
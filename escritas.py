@@ -0,0 +1,230 @@
+import json
+import logging
+import os
+import queue
+import threading
+import uuid
+
+import armazenamento
+import metricas
+from config import ESCRITAS_PENDENTES_PATH, LOTE_ESCRITAS, TENTATIVAS_ESCRITA, RESULTADOS_MANTIDOS, INTERVALO_ARQUIVAMENTO, COLUNA_ID
+
+
+# Fila de gravações do processo. Os botões de salvar só anotam a operação num
+# journal local (write-ahead, com fsync) e voltam na hora; uma única thread
+# aplica as operações no armazenamento em lotes, juntando as alterações em
+# sequência de um mesmo registro. O resultado de cada operação fica guardado
+# até a sessão que a enviou perguntar por ele (no máximo RESULTADOS_MANTIDOS,
+# de sessões que não voltaram; os mais antigos saem primeiro). Operações que não chegaram a
+# ser concluídas são reenviadas quando o app sobe de novo. Uma operação com
+# erro volta para a fila até falhar TENTATIVAS_ESCRITA vezes. A mesma thread
+# arquiva os registros antigos, fora do carregamento das páginas.
+class FilaEscrita:
+    def __init__(self, banco, caminho=ESCRITAS_PENDENTES_PATH):
+        self.banco = banco
+        self.caminho = caminho
+        self._fila = queue.Queue()
+        self._lock = threading.Lock()
+        self._pendentes = set()
+        self._resultados = {}
+
+        for operacao in self._ler_pendentes():
+            operacao["reenvio"] = True
+            self._pendentes.add(operacao["id"])
+            self._fila.put(operacao)
+
+        self._thread = threading.Thread(target=self._trabalhar, name="fila-escrita", daemon=True)
+        self._thread.start()
+
+    # Novo registro; o ID é gerado aqui para a operação poder ser reenviada sem duplicar
+    def inserir(self, registro):
+        registro = {**registro, COLUNA_ID: registro.get(COLUNA_ID) or armazenamento.novo_id()}
+        return self._enviar({"operacao": "inserir", "registro": registro})
+
+    def atualizar(self, chave, valores, versao_esperada=None):
+        return self._enviar({"operacao": "atualizar", "chave": chave, "valores": valores, "versao_esperada": versao_esperada})
+
+    @metricas.cronometrar("write")
+    def _enviar(self, operacao):
+        operacao["id"] = uuid.uuid4().hex
+        linha = json.dumps(operacao, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            with open(self.caminho, "a", encoding="utf-8") as f:
+                f.write(linha)
+                f.flush()
+                os.fsync(f.fileno())
+            self._pendentes.add(operacao["id"])
+        metricas.contar(linhas=1, bytes_gravados=len(linha.encode("utf-8")))
+        self._fila.put(operacao)
+        return operacao["id"]
+
+    # {"situacao": "ok" | "conflito" | "erro", "mensagem": ...} de uma operação
+    # concluída (entregue uma única vez), ou None enquanto ela está na fila
+    def resultado(self, id_operacao):
+        with self._lock:
+            return self._resultados.pop(id_operacao, None)
+
+    def pendentes(self):
+        with self._lock:
+            return len(self._pendentes)
+
+    # Operações do journal sem o registro de conclusão correspondente, com as falhas já contadas
+    def _ler_pendentes(self):
+        operacoes = {}
+        if os.path.exists(self.caminho):
+            with open(self.caminho, encoding="utf-8") as f:
+                for linha in f:
+                    try:
+                        item = json.loads(linha)
+                    except json.JSONDecodeError:
+                        # Linha incompleta de uma gravação interrompida
+                        continue
+                    if "concluidas" in item:
+                        for id_operacao in item["concluidas"]:
+                            operacoes.pop(id_operacao, None)
+                        for id_operacao in item.get("falhas", []):
+                            if id_operacao in operacoes:
+                                operacoes[id_operacao]["falhas"] = operacoes[id_operacao].get("falhas", 0) + 1
+                    else:
+                        operacoes[item["id"]] = item
+        return list(operacoes.values())
+
+    def _trabalhar(self):
+        while True:
+            self._arquivar()
+            try:
+                lote = [self._fila.get(timeout=INTERVALO_ARQUIVAMENTO)]
+            except queue.Empty:
+                continue
+            while len(lote) < LOTE_ESCRITAS:
+                try:
+                    lote.append(self._fila.get_nowait())
+                except queue.Empty:
+                    break
+
+            resultados = {}
+            for operacao, ids in _agrupar(lote):
+                resultado = self._aplicar(operacao)
+                for id_operacao in ids:
+                    resultados[id_operacao] = resultado
+            self._concluir(resultados, {operacao["id"]: operacao for operacao in lote})
+
+    # Arquivamento periódico (armazenamento.arquivar_se_preciso); uma falha fica no
+    # log e não derruba a thread de gravação
+    def _arquivar(self):
+        try:
+            armazenamento.arquivar_se_preciso(self.banco)
+        except Exception:
+            logging.getLogger(__name__).exception("Falha ao arquivar registros antigos")
+
+    def _aplicar(self, operacao):
+        try:
+            if operacao.get("reenvio") and self._ja_aplicada(operacao):
+                pass
+            elif operacao["operacao"] == "inserir":
+                self.banco.inserir(operacao["registro"])
+            else:
+                self.banco.atualizar(operacao["chave"], operacao["valores"], versao_esperada=operacao["versao_esperada"],
+                                     alteracoes=operacao.get("alteracoes", 1))
+            return {"situacao": "ok", "mensagem": ""}
+        except armazenamento.RegistroDesatualizado as e:
+            return {"situacao": "conflito", "mensagem": str(e)}
+        except Exception as e:
+            return {"situacao": "erro", "mensagem": str(e)}
+
+    # Reenvio depois de uma parada: a operação pode ter sido gravada antes do
+    # registro de conclusão. Inserções são reconhecidas pelo ID; alterações,
+    # pela versão já avançada com os mesmos valores.
+    def _ja_aplicada(self, operacao):
+        chave = operacao["registro"][COLUNA_ID] if operacao["operacao"] == "inserir" else operacao["chave"]
+        try:
+            registro = self.banco.obter(chave)
+        except KeyError:
+            return False
+        if operacao["operacao"] == "inserir":
+            return True
+        if armazenamento.versao_registro(registro) <= (operacao["versao_esperada"] or 0):
+            return False
+        return all(str(registro.get(coluna)) == str(valor) for coluna, valor in operacao["valores"].items())
+
+    # Anota as operações concluídas e as falhas no journal; com a fila vazia o journal
+    # é zerado. Uma operação com erro volta para a fila como reenvio (sozinha e
+    # conferida antes, pois pode ter sido gravada em parte); na TENTATIVAS_ESCRITA-ésima
+    # falha ela é concluída e o erro é entregue à sessão.
+    def _concluir(self, resultados, operacoes):
+        concluidas, falhas = [], []
+        for id_operacao, resultado in resultados.items():
+            operacao = operacoes[id_operacao]
+            if resultado["situacao"] == "erro" and operacao.get("falhas", 0) + 1 < TENTATIVAS_ESCRITA:
+                falhas.append({**operacao, "falhas": operacao.get("falhas", 0) + 1, "reenvio": True})
+            else:
+                concluidas.append(id_operacao)
+        with self._lock:
+            self._resultados.update((id_operacao, resultados[id_operacao]) for id_operacao in concluidas)
+            while len(self._resultados) > RESULTADOS_MANTIDOS:
+                del self._resultados[next(iter(self._resultados))]
+            self._pendentes.difference_update(concluidas)
+            if not self._pendentes:
+                with open(self.caminho, "w", encoding="utf-8") as f:
+                    f.flush()
+                    os.fsync(f.fileno())
+            else:
+                with open(self.caminho, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"concluidas": concluidas, "falhas": [operacao["id"] for operacao in falhas]}) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+        for operacao in falhas:
+            self._fila.put(operacao)
+
+
+# Junta as operações de um lote: alterações de um registro que partem da versão
+# deixada pela alteração anterior do mesmo registro viram uma gravação só, que
+# avança a versão uma vez por alteração juntada (como a sessão espera). Alterações
+# concorrentes (mesma versão esperada) continuam separadas, para a segunda ser
+# rejeitada. Reenvios não são juntados.
+def _agrupar(lote):
+    grupos = []
+    ultimo = {}
+    for operacao in lote:
+        if operacao["operacao"] == "inserir":
+            chave = operacao["registro"][COLUNA_ID]
+        else:
+            chave = operacao["chave"]
+        grupo = ultimo.get(chave)
+        encadeada = (
+            grupo is not None and operacao["operacao"] == "atualizar" and not operacao.get("reenvio")
+            and operacao["versao_esperada"] in (None, grupo["versao"])
+        )
+        if encadeada:
+            combinada = grupo["operacao"]
+            combinada["valores"] = {**combinada["valores"], **operacao["valores"]}
+            combinada["alteracoes"] += 1
+            grupo["ids"].append(operacao["id"])
+            if grupo["versao"] is not None:
+                grupo["versao"] += 1
+            continue
+
+        grupo = {"operacao": dict(operacao), "ids": [operacao["id"]]}
+        grupos.append(grupo)
+        if operacao["operacao"] == "atualizar" and not operacao.get("reenvio"):
+            grupo["operacao"]["alteracoes"] = 1
+            versao = operacao["versao_esperada"]
+            grupo["versao"] = None if versao is None else versao + 1
+            ultimo[chave] = grupo
+        else:
+            # Um registro só aparece para edição depois de gravado: nada se junta a uma inserção
+            ultimo.pop(chave, None)
+    return [(grupo["operacao"], grupo["ids"]) for grupo in grupos]
+
+
+_filas = {}
+_fila_lock = threading.Lock()
+
+
+# Uma fila (e uma thread de gravação) por armazenamento (rota) no processo;
+# cada rota tem o próprio journal de gravações pendentes
+def obter_fila(banco, caminho=ESCRITAS_PENDENTES_PATH):
+    with _fila_lock:
+        if banco not in _filas:
+            _filas[banco] = FilaEscrita(banco, caminho)
+        return _filas[banco]
@@ -0,0 +1,48 @@
+import os
+import tempfile
+
+import pandas as pd
+from openpyxl import Workbook
+
+from config import SHEET_NAME, colunas_armazenadas
+
+# Formatos de exportação: extensão do arquivo e tipo MIME do download
+formatos_exportacao = {
+    "CSV": (".csv", "text/csv"),
+    "XLSX": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+# Grava os lotes de iterar_registros num CSV, um lote por vez.
+# Separador ";" e BOM UTF-8, que é o que o Excel em português espera.
+def _gravar_csv(lotes, caminho):
+    with open(caminho, "w", encoding="utf-8-sig", newline="") as f:
+        f.write(";".join(colunas_armazenadas) + "\n")
+        for lote in lotes:
+            lote.to_csv(f, sep=";", header=False, index=False)
+
+
+# Grava os lotes num xlsx com o openpyxl em modo write_only: as linhas vão
+# direto para o arquivo e a memória não cresce com o tamanho da exportação
+def _gravar_xlsx(lotes, caminho):
+    livro = Workbook(write_only=True)
+    planilha = livro.create_sheet(SHEET_NAME)
+    planilha.append(colunas_armazenadas)
+    for lote in lotes:
+        for linha in lote.itertuples(index=False, name=None):
+            planilha.append([None if not isinstance(valor, str) and pd.isna(valor) else valor for valor in linha])
+    livro.save(caminho)
+
+
+# Exporta os registros do período no formato pedido e devolve o conteúdo do arquivo
+def exportar(banco, formato="XLSX", data_inicio=None, data_fim=None):
+    extensao, _ = formatos_exportacao[formato]
+    gravar = _gravar_csv if formato == "CSV" else _gravar_xlsx
+    descritor, caminho = tempfile.mkstemp(suffix=extensao)
+    os.close(descritor)
+    try:
+        gravar(banco.iterar_registros(data_inicio, data_fim), caminho)
+        with open(caminho, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(caminho)
@@ -0,0 +1,115 @@
+"""Importação em lote de planilhas (xlsx/csv) preenchidas fora do app.
+
+As colunas são casadas com colunas_esperadas (ignorando maiúsculas, acentos
+e espaços), os horários vão para o formato gravado pelo app e os registros
+que já existem (mesma placa + "Entrada na Fábrica") são ignorados. Tudo é
+gravado numa única transação.
+
+Uso:
+    python importacao.py arquivo1.xlsx arquivo2.csv ...
+    python importacao.py --rota "Rota 2" arquivo.xlsx
+"""
+import argparse
+import os
+import sys
+import unicodedata
+
+import pandas as pd
+
+import armazenamento
+import metricas
+from calculos import FORMATO_HORARIO
+from config import ROTAS, SHEET_NAME, campos_tempo, colunas_esperadas
+
+# Só as colunas digitadas são importadas; os campos calculados são refeitos
+colunas_importadas = ["Data", "Placa do caminhão", "Nome do conferente"] + campos_tempo
+
+
+def _nome_simples(nome):
+    nome = unicodedata.normalize("NFKD", str(nome)).encode("ascii", "ignore").decode()
+    return " ".join(nome.lower().split())
+
+
+_colunas_por_nome = {_nome_simples(coluna): coluna for coluna in colunas_esperadas}
+
+
+# Lê um xlsx (aba SHEET_NAME, ou a primeira) ou um csv (separador ";" ou ",")
+@metricas.cronometrar("load")
+def ler_arquivo(arquivo, nome=None):
+    nome = nome or getattr(arquivo, "name", str(arquivo))
+    if isinstance(arquivo, (str, os.PathLike)):
+        metricas.contar(bytes_lidos=os.path.getsize(arquivo))
+    else:
+        metricas.contar(bytes_lidos=getattr(arquivo, "size", 0))
+    if nome.lower().endswith(".csv"):
+        return pd.read_csv(arquivo, sep=None, engine="python", dtype=object, encoding="utf-8-sig")
+    abas = pd.read_excel(arquivo, sheet_name=None, engine="openpyxl", dtype=object)
+    return abas.get(SHEET_NAME, next(iter(abas.values())))
+
+
+# Formatos com o dia na frente, comuns em planilhas preenchidas à mão
+formatos_dia_primeiro = ["%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y", "%d/%m/%y %H:%M", "%d/%m/%y"]
+
+
+# Converte uma coluna de horários para o texto do app. Tenta primeiro o formato
+# ISO (o da planilha do app), depois os formatos_dia_primeiro, cada um de uma
+# vez para a coluna toda; o que não for reconhecido fica como está.
+def _normalizar_horarios(serie, formato):
+    serie = serie.astype(object)
+    vazios = pd.isna(serie) | (serie.astype(str).str.strip() == "")
+    convertida = pd.to_datetime(serie.where(~vazios), format="ISO8601", errors="coerce")
+    for formato_dia in formatos_dia_primeiro:
+        restantes = ~vazios & convertida.isna()
+        if not restantes.any():
+            break
+        convertida[restantes] = pd.to_datetime(serie[restantes].astype(str).str.strip(), format=formato_dia, errors="coerce")
+
+    resultado = serie.where(~vazios, "").astype(str).str.strip().astype(object)
+    reconhecidos = convertida.notna()
+    resultado[reconhecidos] = convertida[reconhecidos].dt.strftime(formato)
+    return resultado
+
+
+# Deixa um DataFrame lido de qualquer planilha no layout de colunas_esperadas
+@metricas.cronometrar("compute", linhas=True)
+def normalizar(df):
+    df = df.rename(columns=lambda coluna: _colunas_por_nome.get(_nome_simples(coluna), coluna))
+    resultado = pd.DataFrame(index=df.index)
+    for coluna in colunas_importadas:
+        if coluna not in df.columns:
+            resultado[coluna] = ""
+        elif coluna == "Data":
+            resultado[coluna] = _normalizar_horarios(df[coluna], "%Y-%m-%d")
+        elif coluna in campos_tempo:
+            resultado[coluna] = _normalizar_horarios(df[coluna], FORMATO_HORARIO)
+        else:
+            resultado[coluna] = df[coluna].astype(object).where(df[coluna].notna(), "").astype(str).str.strip()
+
+    # Linhas totalmente vazias (comuns no fim de planilhas preenchidas à mão) saem
+    return resultado[(resultado != "").any(axis=1)].reset_index(drop=True)
+
+
+# Lê, normaliza e importa vários arquivos de uma vez
+def importar_arquivos(banco, arquivos):
+    df = pd.concat([normalizar(ler_arquivo(arquivo)) for arquivo in arquivos], ignore_index=True)
+    return {"lidos": len(df), **banco.importar(df)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("arquivos", nargs="+", help="planilhas .xlsx ou .csv")
+    parser.add_argument("--rota", choices=ROTAS, default=ROTAS[0], help="rota (fábrica → CD) que recebe os registros")
+    args = parser.parse_args()
+
+    faltando = [arquivo for arquivo in args.arquivos if not os.path.exists(arquivo)]
+    if faltando:
+        parser.error(f"arquivo não encontrado: {', '.join(faltando)}")
+
+    resultado = importar_arquivos(armazenamento.obter_armazenamento(args.rota), args.arquivos)
+    print(f"linhas lidas:  {resultado['lidos']}")
+    print(f"importadas:    {resultado['importados']}")
+    print(f"duplicadas:    {resultado['duplicados']} (ignoradas)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
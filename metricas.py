@@ -0,0 +1,191 @@
+import functools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+import pandas as pd
+
+from config import METRICAS_ATIVAS, METRICAS_PATH, METRICAS_TAMANHO_MAXIMO, METRICAS_ARQUIVOS, FUSO_HORARIO
+
+# Etapas medidas em cada execução do script. O tempo é exclusivo: enquanto
+# uma etapa aninhada roda (um "load" dentro de um "filter"), só ela conta.
+# Tudo o que não está em outra etapa é "render".
+ETAPAS = ["load", "filter", "compute", "render", "write"]
+
+_local = threading.local()
+_log = None
+_log_lock = threading.Lock()
+
+
+class Medicao:
+    def __init__(self, pagina):
+        self.pagina = pagina
+        self.momento = datetime.now(FUSO_HORARIO).isoformat(timespec="seconds")
+        self.etapas = {etapa: {"segundos": 0.0, "linhas": 0, "bytes_lidos": 0, "bytes_gravados": 0} for etapa in ETAPAS}
+        self.cache = {"acertos": 0, "falhas": 0}
+        self.total = 0.0
+        self.finalizada = False
+        self._inicio = time.perf_counter()
+        self._pilha = ["render"]
+        self._marca = self._inicio
+
+    # Lança o tempo decorrido na etapa do topo da pilha
+    def _acumular(self):
+        agora = time.perf_counter()
+        self.etapas[self._pilha[-1]]["segundos"] += agora - self._marca
+        self._marca = agora
+
+    def entrar(self, etapa):
+        self._acumular()
+        self._pilha.append(etapa)
+
+    def sair(self):
+        self._acumular()
+        if len(self._pilha) > 1:
+            self._pilha.pop()
+
+    def contar(self, linhas=0, bytes_lidos=0, bytes_gravados=0):
+        valores = self.etapas[self._pilha[-1]]
+        valores["linhas"] += linhas
+        valores["bytes_lidos"] += bytes_lidos
+        valores["bytes_gravados"] += bytes_gravados
+
+    def finalizar(self):
+        if self.finalizada:
+            return
+        self._acumular()
+        self.total = time.perf_counter() - self._inicio
+        self.finalizada = True
+        _gravar(self.como_dict())
+
+    def como_dict(self):
+        return {
+            "momento": self.momento,
+            "pagina": self.pagina,
+            "total_s": round(self.total, 4),
+            "etapas": {
+                etapa: {**valores, "segundos": round(valores["segundos"], 4)}
+                for etapa, valores in self.etapas.items()
+            },
+            "cache": dict(self.cache),
+        }
+
+    def tabela(self):
+        df = pd.DataFrame.from_dict(self.etapas, orient="index")
+        df["ms"] = (df.pop("segundos") * 1000).round(1)
+        return df[["ms", "linhas", "bytes_lidos", "bytes_gravados"]]
+
+
+# Começa a medição de uma execução do script na thread atual. A execução
+# anterior da sessão, se ainda aberta (st.rerun() interrompe o script antes
+# do fim), é finalizada aqui.
+def iniciar(pagina, anterior=None):
+    if anterior is not None:
+        anterior.finalizar()
+    if not METRICAS_ATIVAS:
+        _local.medicao = None
+        return None
+    _local.medicao = Medicao(pagina)
+    return _local.medicao
+
+
+def atual():
+    return getattr(_local, "medicao", None)
+
+
+@contextmanager
+def etapa(nome):
+    medicao = atual()
+    if medicao is None or medicao.finalizada:
+        yield
+        return
+    medicao.entrar(nome)
+    try:
+        yield
+    finally:
+        medicao.sair()
+
+
+# Decorador: mede a função inteira como `nome`; com `linhas=True` conta o
+# tamanho do primeiro DataFrame recebido como linhas processadas
+def cronometrar(nome, linhas=False):
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            if atual() is None:
+                return funcao(*args, **kwargs)
+            with etapa(nome):
+                if linhas:
+                    df = next((arg for arg in args if isinstance(arg, pd.DataFrame)), None)
+                    if df is not None:
+                        contar(linhas=len(df))
+                return funcao(*args, **kwargs)
+        return medida
+    return decorador
+
+
+def contar(linhas=0, bytes_lidos=0, bytes_gravados=0):
+    medicao = atual()
+    if medicao is not None and not medicao.finalizada:
+        medicao.contar(linhas, bytes_lidos, bytes_gravados)
+
+
+def contar_cache(acerto):
+    medicao = atual()
+    if medicao is not None:
+        medicao.cache["acertos" if acerto else "falhas"] += 1
+
+
+# Log local em JSON (uma linha por execução), rotacionado por tamanho
+def _gravar(registro):
+    global _log
+    with _log_lock:
+        if _log is None:
+            _log = logging.getLogger("metricas")
+            _log.setLevel(logging.INFO)
+            _log.propagate = False
+            handler = RotatingFileHandler(METRICAS_PATH, maxBytes=METRICAS_TAMANHO_MAXIMO,
+                                          backupCount=METRICAS_ARQUIVOS, encoding="utf-8", delay=True)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _log.addHandler(handler)
+    try:
+        _log.info(json.dumps(registro, ensure_ascii=False))
+    except Exception:
+        # Métrica nunca derruba a página
+        pass
+
+
+# Últimas execuções gravadas no log atual, para o painel de administração
+def ultimas(quantidade=200):
+    try:
+        with open(METRICAS_PATH, encoding="utf-8") as f:
+            linhas = deque(f, maxlen=quantidade)
+    except FileNotFoundError:
+        return []
+    registros = []
+    for linha in linhas:
+        try:
+            registros.append(json.loads(linha))
+        except ValueError:
+            continue
+    return registros
+
+
+# Média de tempo por etapa e por página, em ms
+def resumo_paginas(registros):
+    if not registros:
+        return pd.DataFrame()
+    linhas = [
+        {"Página": r["pagina"], "Total": r["total_s"] * 1000,
+         **{nome: valores["segundos"] * 1000 for nome, valores in r["etapas"].items()}}
+        for r in registros
+    ]
+    df = pd.DataFrame(linhas)
+    resumo = df.groupby("Página").mean().round(1)
+    resumo.insert(0, "Execuções", df.groupby("Página").size())
+    return resumo
@@ -0,0 +1,56 @@
+import threading
+
+import armazenamento
+from config import COLUNA_ID
+
+
+# Visão dos registros em aberto compartilhada pelas sessões do painel "Em Operação".
+# A primeira leitura carrega todos os abertos; depois, cada atualização só aplica as
+# alterações gravadas desde a anterior (ver alteracoes_desde), então o custo acompanha
+# o número de mudanças e não o de registros. Importações e registros de alterações
+# já descartados fazem a visão ser relida inteira.
+class PainelOperacao:
+    def __init__(self, banco):
+        self.banco = banco
+        self._lock = threading.Lock()
+        self._abertos = None
+        self._seq = 0
+        # ID -> seq em que o registro mudou, para cada sessão saber o que mudou desde a sua leitura
+        self._alterados = {}
+
+    # Registros em aberto em dia com o armazenamento, os IDs alterados depois de
+    # `visto` e a posição atual do registro de alterações (o `visto` da próxima chamada).
+    # O DataFrame devolvido é compartilhado e não deve ser alterado.
+    def atualizar(self, visto=None):
+        with self._lock:
+            alteracoes = None if self._abertos is None else self.banco.alteracoes_desde(self._seq)
+            if alteracoes is None or any(alteracao[COLUNA_ID] is None for alteracao in alteracoes):
+                self._recarregar()
+            elif alteracoes:
+                self._abertos, alterados = armazenamento.aplicar_alteracoes(self._abertos, alteracoes)
+                self._seq = alteracoes[-1]["seq"]
+                for chave in [chave for chave in self._alterados if chave not in self._abertos.index]:
+                    del self._alterados[chave]
+                self._alterados.update((chave, self._seq) for chave in alterados if chave in self._abertos.index)
+            alterados = set() if visto is None else {chave for chave, seq in self._alterados.items() if seq > visto}
+            return self._abertos, alterados, self._seq
+
+    def _recarregar(self):
+        # A posição é lida antes dos registros: uma alteração gravada no meio da
+        # leitura é aplicada (de novo, sem efeito) na próxima atualização
+        seq = self.banco.ultima_alteracao()
+        self._abertos = self.banco.registros_abertos()
+        self._seq = seq
+        self._alterados = {}
+
+
+_paineis = {}
+_painel_lock = threading.Lock()
+
+
+# Uma visão por armazenamento (rota) no processo, como a fila de escrita
+def obter_painel(banco):
+    with _painel_lock:
+        if banco not in _paineis:
+            _paineis[banco] = PainelOperacao(banco)
+        return _paineis[banco]